@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import sys
+import httpx
+from client import BASE_URL, batch_segments
+
+# asyncio counterpart of client.UserClient for migration scripts that fire
+# thousands of calls; the semaphore caps requests in flight and httpx keeps
+# the connections alive between them
+class AsyncUserClient:
+    def __init__(self, base_url=BASE_URL, concurrency=100, timeout=30.0):
+        self.token = None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+
+    async def request(self, method, path, **kwargs):
+        async with self.semaphore:
+            response = await self.client.request(method, path, **kwargs)
+        try:
+            return response.json()
+        except ValueError:
+            return {"status": response.status_code}
+
+    async def login(self, username, password):
+        data = await self.request("POST", "/login", json={"username": username, "password": password})
+        if data.get("token"):
+            self.token = data.get("token")
+            self.client.headers["Authorization"] = f"token-{self.token}"
+        else:
+            self.token = None
+            self.client.headers.pop("Authorization", None)
+        return data
+
+    async def signup(self, username, password):
+        return await self.request("POST", "/signup", json={"username": username, "password": password})
+
+    async def create(self, name, age):
+        return await self.request("POST", "/users", json={"name": name, "age": age})
+
+    async def update(self, name, age):
+        return await self.request("PUT", f"/users/{name}", json={"age": age})
+
+    async def delete(self, name):
+        return await self.request("DELETE", f"/users/{name}")
+
+    async def get(self, name):
+        return await self.request("GET", f"/users/{name}")
+
+    async def list(self):
+        return await self.request("GET", "/users/all")
+
+    async def secret(self):
+        return await self.request("GET", "/secret")
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+async def run_command(client, command):
+    act, args = command
+    try:
+        return act, args, await getattr(client, act)(*args)
+    except httpx.HTTPError as e:
+        return act, args, {"error": str(e)}
+
+async def run_batch(client, lines):
+    results = []
+    for auth, commands in batch_segments(lines):
+        if auth is not None:
+            results.append(await run_command(client, auth))
+        results.extend(await asyncio.gather(*(run_command(client, command) for command in commands)))
+    return results
+
+async def main(url, batch, concurrency):
+    source = sys.stdin if batch == "-" else open(batch)
+    with source:
+        lines = source.readlines()
+    async with AsyncUserClient(url, concurrency) as client:
+        for act, params, result in await run_batch(client, lines):
+            print(act, *params, "->", result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async batch client for the user API")
+    parser.add_argument("batch", help="file with one command per line, - for stdin")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.batch, args.concurrency))
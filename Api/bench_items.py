@@ -0,0 +1,54 @@
+import sys
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+import main
+
+# requests/sec for read_item and put_item: the original dict-returning
+# handlers against main.app's typed handlers and response models.
+# Run with: python bench_items.py [requests]
+
+def baseline_app():
+    app = FastAPI()
+    items = {}
+
+    class Item(BaseModel):
+        name:  str
+        price: float
+        is_offer: bool | None=None
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int, q: str | None = None):
+        return {"item_id": item_id, "q": q, **items[item_id]}
+
+    @app.put("/item/{item_id}")
+    def put_item(item_id: int, item: Item):
+        items[item_id] = item.model_dump()
+        return {"item_name": item.name, "item_id": item_id}
+
+    return app
+
+def rate(client, count, call):
+    start = time.perf_counter()
+    for i in range(count):
+        call(client, i % 1000).raise_for_status()
+    return count / (time.perf_counter() - start)
+
+def put(client, i):
+    return client.put(f"/item/{i}", json={"name": f"item{i}", "price": i * 1.5, "is_offer": i % 2 == 0})
+
+def read(client, i):
+    return client.get(f"/items/{i}", params={"q": "bench"})
+
+def main_bench(count=5000):
+    for label, app in (("before", baseline_app()), ("after", main.app)):
+        with TestClient(app) as client:
+            for i in range(1000):
+                put(client, i)
+            put_rate = rate(client, count, put)
+            read_rate = rate(client, count, read)
+        print(f"{label:>6}: put_item {put_rate:8.0f} req/s   read_item {read_rate:8.0f} req/s")
+
+if __name__ == "__main__":
+    main_bench(*[int(arg) for arg in sys.argv[1:2]])
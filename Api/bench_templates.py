@@ -0,0 +1,60 @@
+import os
+import time
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from template_filters import FILTERS
+
+# compares the old f-string listing with the precompiled users_all.html
+# template, run with: python bench_templates.py [users] [rounds]
+
+def fstring_listing(users):
+    html = "<h2>All Users</h2><ul>"
+    for name, info in users:
+        html += f"""
+        <li>
+            {name}: Age {info['age']}
+            <!-- Delete Form -->
+            <form action="/users/{name}" method="post" style="display:inline;">
+                <input type="hidden" name="_method" value="DELETE">
+                <input type="submit" value="Delete">
+            </form>
+
+            <!-- Update Form -->
+            <form action="/users/{name}" method="post" style="display:inline;">
+                <input type="hidden" name="_method" value="PUT">
+                <input type="number" name="age" placeholder="New Age">
+                <input type="submit" value="Update">
+            </form>
+        </li>
+        """
+    html += "</ul><a href='/users'>Create New User</a>"
+    return html
+
+def measure(render, rounds):
+    timings = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def main(count=10000, rounds=20):
+    users = [(f"user{i}", {"age": i % 90 + 10}) for i in range(count)]
+    env = Environment(
+        loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+        autoescape=select_autoescape(),
+    )
+    env.filters.update(FILTERS)
+    template = env.get_template('users_all.html')
+
+    before = measure(lambda: fstring_listing(users), rounds)
+    after = measure(lambda: template.render(users=users), rounds)
+    first_chunk = measure(lambda: next(template.generate(users=users)), rounds)
+    print(f"{count} users, median of {rounds} rounds")
+    print(f"f-string concatenation: {before * 1000:.2f} ms")
+    print(f"precompiled template:   {after * 1000:.2f} ms")
+    print(f"template first chunk:   {first_chunk * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:3]])
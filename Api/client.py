@@ -1,70 +1,181 @@
+import argparse
+import shlex
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import requests
-token=None
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 BASE_URL="http://127.0.0.1:5000"
-url=f"{BASE_URL}/users"
-headers = {"Content-Type": "application/json", "Accept": "application/json"}
-running=True
-def login():
-    global token
-    username=input("Enter username: ")
-    password=input("Enter password: ")
-    res=requests.post(f"{BASE_URL}/login",json={"username":username,"password":password}, headers=headers)
-    data=res.json()
-    print("Login response: ", data)
-    if data.get("token"):
-        token=data.get("token")
-        headers["Authorization"]=f"token-{token}"
-    else:
-        print("Login failed")
-        token=None
-        
-def signup():
-    username=input("Enter username: ")
-    password=input("Enter password: ")
-    res=requests.post(f"{BASE_URL}/signup",json={"username":username,"password":password}, headers=headers)
-    data=res.json()
-    print("Signup response: ", data)
-    
-    
-while running:
-    act=input("What do you want to do: ")
-    if act=="create":
-        name=input("Enter name: ")
-        age=input("Enter age: ")
-        # add a new user
-        response_post=requests.post(url,json={"name":name,"age":age}, headers=headers)
-        print("Post response: ", response_post.json())
-    elif act=="update":
-        name=input("Enter name: ")
-        age=input("Enter the update age: ")
-        #update the new user
-        response_put=requests.put(f"{url}/{name}", json={"age": age}, headers=headers)
-        print("Put response: ", response_put.json())
-
-    elif act=="delete":
-        name=input("Enter name: ")
-        #delete a new user
-        response_del=requests.delete(f"{url}/{name}", headers=headers)
-        print("Delete response: ", response_del.json())
-
-    elif act=="list":
-        #list all users
-        response_list=requests.get(f"{url}/all", headers=headers)
-        print("List response: ")
-        for name, info in response_list.json().items():
-            print(f"Name: {name}, Age: {info['age']}")
-    elif act=="get":
-        name=input("Enter name: ")
-        #get a user
-        response_get=requests.get(f"{url}/{name}", headers=headers)
-        print("Get response: ", response_get.json())
-    elif act=="exit":
-        running=False
-    elif act == "secret":
-        response_secret = requests.get("http://127.0.0.1:5000/secret", headers=headers)
-        print("Secret response:", response_secret.json())
-    elif act=="login":
-        login()
-
-    else:
-        print("Please enter a valid action")
\ No newline at end of file
+# (connect, read) seconds
+TIMEOUT=(3.05, 30)
+
+class UserClient:
+    def __init__(self, base_url=BASE_URL, pool_size=10, retries=3, backoff=0.3, timeout=TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.token = None
+        # GET/PUT/DELETE are retried on connection errors and 429/5xx with
+        # exponential backoff, POST only when the request never got sent
+        retry = Retry(total=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "Accept": "application/json"})
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def data(self, response):
+        try:
+            return response.json()
+        except ValueError:
+            return {"status": response.status_code}
+
+    def login(self, username, password):
+        res = self.request("POST", "/login", json={"username": username, "password": password},
+                           allow_redirects=False)
+        data = self.data(res)
+        if data.get("token"):
+            self.token = data.get("token")
+            self.session.headers["Authorization"] = f"token-{self.token}"
+        else:
+            self.token = None
+            self.session.headers.pop("Authorization", None)
+        return data
+
+    def signup(self, username, password):
+        return self.data(self.request("POST", "/signup", json={"username": username, "password": password}))
+
+    def create(self, name, age):
+        return self.data(self.request("POST", "/users", json={"name": name, "age": age}))
+
+    def update(self, name, age):
+        return self.data(self.request("PUT", f"/users/{name}", json={"age": age}))
+
+    def delete(self, name):
+        return self.data(self.request("DELETE", f"/users/{name}"))
+
+    def get(self, name):
+        return self.data(self.request("GET", f"/users/{name}"))
+
+    def list(self):
+        return self.data(self.request("GET", "/users/all"))
+
+    def secret(self):
+        return self.data(self.request("GET", "/secret"))
+
+    def close(self):
+        self.session.close()
+
+# batch files hold one command per line, e.g. "create alice 30",
+# "update alice 31", "delete alice", "get alice", "list", "login bob pw"
+COMMANDS = {
+    "create": 2, "update": 2, "delete": 1, "get": 1, "list": 0, "secret": 0, "login": 2, "signup": 2,
+}
+
+def parse_command(line):
+    parts = shlex.split(line, comments=True)
+    if not parts:
+        return None
+    act, args = parts[0], parts[1:]
+    if COMMANDS.get(act) != len(args):
+        raise ValueError(f"Invalid command: {line.strip()}")
+    return act, args
+
+def run_command(client, command):
+    act, args = command
+    try:
+        return act, args, getattr(client, act)(*args)
+    except requests.exceptions.RequestException as e:
+        return act, args, {"error": str(e)}
+
+AUTH_COMMANDS = ("login", "signup")
+
+# splits a batch into (auth command or None, commands) segments: a login
+# changes the session for the lines after it, so each auth command runs on
+# its own and only the commands up to the next one may run concurrently
+def batch_segments(lines):
+    segments = [(None, [])]
+    for command in filter(None, map(parse_command, lines)):
+        if command[0] in AUTH_COMMANDS:
+            segments.append((command, []))
+        else:
+            segments[-1][1].append(command)
+    return segments
+
+# results come back in file order
+def run_batch(client, lines, workers=8):
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for auth, commands in batch_segments(lines):
+            if auth is not None:
+                results.append(run_command(client, auth))
+            results.extend(pool.map(lambda command: run_command(client, command), commands))
+    return results
+
+def interactive(client):
+    running=True
+    while running:
+        act=input("What do you want to do: ")
+        if act=="create":
+            name=input("Enter name: ")
+            age=input("Enter age: ")
+            # add a new user
+            print("Post response: ", client.create(name, age))
+        elif act=="update":
+            name=input("Enter name: ")
+            age=input("Enter the update age: ")
+            #update the new user
+            print("Put response: ", client.update(name, age))
+        elif act=="delete":
+            name=input("Enter name: ")
+            #delete a new user
+            print("Delete response: ", client.delete(name))
+        elif act=="list":
+            #list all users
+            print("List response: ")
+            for name, info in client.list().items():
+                print(f"Name: {name}, Age: {info['age']}")
+        elif act=="get":
+            name=input("Enter name: ")
+            #get a user
+            print("Get response: ", client.get(name))
+        elif act=="exit":
+            running=False
+        elif act == "secret":
+            print("Secret response:", client.secret())
+        elif act=="login":
+            username=input("Enter username: ")
+            password=input("Enter password: ")
+            data=client.login(username, password)
+            print("Login response: ", data)
+            if not client.token:
+                print("Login failed")
+        elif act=="signup":
+            username=input("Enter username: ")
+            password=input("Enter password: ")
+            print("Signup response: ", client.signup(username, password))
+        else:
+            print("Please enter a valid action")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Client for the user API")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--batch", help="file with one command per line, - for stdin")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    client = UserClient(args.url, pool_size=args.workers)
+    try:
+        if args.batch:
+            source = sys.stdin if args.batch == "-" else open(args.batch)
+            with source:
+                for act, params, result in run_batch(client, source, args.workers):
+                    print(act, *params, "->", result)
+        else:
+            interactive(client)
+    finally:
+        client.close()
@@ -1,22 +1,97 @@
-from flask import Flask, jsonify, session, request, render_template, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, g, jsonify, session, request, render_template, redirect, url_for, abort, make_response
 import json, os
-import secrets
 from functools import wraps
+import atexit
+import threading
+import time
+import metrics
+from repository import make_repository
+import user_core
+from user_core import validate_user, validate_name
+from hashing import PasswordHasher, HashPoolBusy
+from session_store import load_secret_key, make_session_interface
+from response_cache import ResponseCache
+from throttle import TokenBucketLimiter, SingleFlight
+from template_filters import FILTERS
 
 app = Flask(__name__)
-app.secret_key=secrets.token_hex(16)
+app.secret_key=load_secret_key('.secret_key')
+app.session_interface=make_session_interface()
+app.jinja_env.filters.update(FILTERS)
 
-DATA_FILE = 'users.json'
-if os.path.exists(DATA_FILE):
-    with open(DATA_FILE, 'r') as f:
-        try:
-            user = json.load(f)
-        except json.JSONDecodeError:
-            user = {}
-else:
-    user = {}
+# opened on first use, not at import: under the debug reloader the watching
+# parent imports this module too, and only the serving process may own the store
+repo = None
+repo_lock = threading.Lock()
+
+def user_repo():
+    global repo
+    if repo is None:
+        with repo_lock:
+            if repo is None:
+                repo = make_repository()
+                atexit.register(repo.close)
+    return repo
+
+hasher = PasswordHasher()
+atexit.register(hasher.close)
+response_cache = ResponseCache()
+coalescer = SingleFlight()
+login_limiter = TokenBucketLimiter(float(os.environ.get('LOGIN_RATE', 1)), float(os.environ.get('LOGIN_BURST', 5)))
+listing_limiter = TokenBucketLimiter(float(os.environ.get('LISTING_RATE', 5)), float(os.environ.get('LISTING_BURST', 20)))
+
+# compile every template once at startup, the forms never change so they
+# are rendered once and served as bytes that browsers may keep for a day
+for template in app.jinja_env.list_templates():
+    app.jinja_env.get_template(template)
+STATIC_PAGES = {
+    template: app.jinja_env.get_template(template).render().encode()
+    for template in ('search_form.html', 'login_form.html', 'signup_form.html')
+}
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.started, endpoint, request.method)
+    metrics.REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if 'started' in g:
+        metrics.IN_FLIGHT.dec()
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def static_page(template):
+    return Response(STATIC_PAGES[template], mimetype='text/html',
+                    headers={"Cache-Control": "public, max-age=86400"})
     
+def rate_limited(limiter, key):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            allowed, retry_after = limiter.acquire(key())
+            if not allowed:
+                return jsonify({"error": "Too many requests, try again later"}), 429, {"Retry-After": str(int(retry_after) + 1)}
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def client_key():
+    return session.get('username') or request.remote_addr
+
+def login_key():
+    username = request.form.get("username") or (request.is_json and request.json.get("username"))
+    return f"{request.remote_addr}:{username}"
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -31,117 +106,160 @@ def override_http_method():
         if method:
             request.environ["REQUEST_METHOD"]=method.upper()
 
-def save_data():
-    with open(DATA_FILE, 'w') as f:
-        json.dump(user, f, indent=4)
-        
-def validate_user(name, age):
-    if not name or not name.strip():
-        return {"error": "Name cannot be empty"}, 400
-    if not age:
-        return {"error": "Age must be taken input"}, 400
-    try:
-        age = int(age)
-        if age <= 0:
-            return {"error": "Age must be a positive integer"}, 400
-    except ValueError:
-        return {"error": "Age must be a valid integer"}, 400
-    
-    return None, age
-        
-def validate_name(name):
-    if not name or not name.strip():
-        return {"error": "Name cannot be empty"}, 400
-    return None
-
 @app.route('/users', methods=["POST"])
 def users():
     name=request.form.get("name") or (request.json and request.json.get("name"))
     age=request.form.get("age") or (request.json and request.json.get("age"))
-    error, age = validate_user(name, age)
-    if error:
-        return jsonify(error), 400
-    elif name in user:
-        return jsonify({"error": f"User {name} already exists"}), 400
-    user[name] = {"age": age}
-    save_data()
+    payload, status = user_core.create_user(user_repo(), name, age)
+    if status != 201:
+        return jsonify(payload), status
     if request.is_json or request.headers.get('Accept') == 'application/json':
-        return jsonify({
-                "message": "User created successfully", 
-                name: user[name]
-                }), 201
-    return f"""
-        <h2>User created successfully</h2>
-        <p>Name: {name}</p>
-        <p>Age: {age}</p>
-        <a href="/users/all">View All Users</a>
-    """, 201
+        return jsonify(payload), 201
+    return render_template('user_saved.html', action='created', name=name, age=payload[name]["age"]), 201
     
+# returns (rows, errors) with rows as (row number, row); a malformed ndjson
+# line is reported as that row's error like any other bad row
+def read_bulk_rows():
+    if request.mimetype == 'application/x-ndjson':
+        rows = []
+        errors = []
+        i = 0
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                rows.append((i, json.loads(line)))
+            except ValueError as e:
+                errors.append({"row": i, "error": f"Invalid JSON: {e}"})
+            i += 1
+        return rows, errors
+    rows = request.get_json()
+    if not isinstance(rows, list):
+        raise ValueError("Body must be a JSON array of users")
+    return list(enumerate(rows)), []
+
+@app.route('/users/bulk', methods=["POST"])
+def bulk_users():
+    try:
+        rows, errors = read_bulk_rows()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid bulk body: {e}"}), 400
+    valid = {}
+    for i, row in rows:
+        name = row.get("name") if isinstance(row, dict) else None
+        if not isinstance(name, str):
+            errors.append({"row": i, "error": "Name cannot be empty"})
+            continue
+        error, age = validate_user(name, row.get("age"))
+        if error:
+            errors.append({"row": i, "name": name, "error": error["error"]})
+            continue
+        valid[name] = age
+    errors.sort(key=lambda error: error["row"])
+    if errors and request.args.get("atomic") == "true":
+        return jsonify({"message": "No users imported", "errors": errors}), 400
+
+    created = 0
+    if valid:
+        created = user_repo().upsert_many([(name, {"age": age}) for name, age in valid.items()])
+    return jsonify({
+        "message": "Bulk import finished",
+        "created": created,
+        "updated": len(valid) - created,
+        "errors": errors
+    }), 200
+
 #addition: updating name
 @app.route('/users/<name>', methods=['PUT'])
 def update_user(name):
-    if name not in user:
-        return jsonify({"error": f"User {name} not found"}), 404
-    age = request.json.get("age")
-    error, age = validate_user(name, age)
-    if error:
-        return jsonify(error), 400
-    user[name] = {"age": age}
-    save_data()
+    payload, status = user_core.update_user(user_repo(), name, request.json.get("age"))
+    if status != 200:
+        return jsonify(payload), status
     if request.is_json or request.headers.get('Accept') == 'application/json':
-        return jsonify({
-            "message": "User updated successfully",
-            name: user[name]
-        }), 200
-    return f"""
-        <h2>User updated successfully</h2>
-        <p>Name: {name}</p>
-        <p>Age: {age}</p>
-        <a href="/users/all">View All Users</a>
-    """, 200
+        return jsonify(payload), 200
+    return render_template('user_saved.html', action='updated', name=name, age=payload[name]["age"]), 200
 
 #addition: deleting user
 @app.route('/users/<name>', methods=['DELETE'])
 def delete_user(name):
-    error=validate_name(name)
-    if error:
-        return jsonify(error), 400
-    if name not in user:
-        return jsonify({"error": f"User {name} not found"}), 404
-    del user[name]
-    save_data()
+    payload, status = user_core.delete_user(user_repo(), name)
+    if status != 200:
+        return jsonify(payload), status
     if request.is_json or request.headers.get('Accept') == 'application/json':
-        return jsonify({"message": "User deleted successfully"}), 200
-    return f"""
-        <h2>User deleted successfully</h2>
-        <a href="/users/all">View All Users</a>
-    """, 200
+        return jsonify(payload), 200
+    return render_template('user_deleted.html'), 200
+
+def stream_html(rows, next_page=None):
+    return app.jinja_env.get_template('users_all.html').generate(users=rows, next_page=next_page)
+
+def response_kind():
+    accept = request.headers.get('Accept')
+    if request.args.get("format") == "ndjson" or accept == 'application/x-ndjson':
+        return 'ndjson'
+    if request.is_json or accept == 'application/json':
+        return 'json'
+    return 'html'
+
+# answers 304 when the client already holds this revision, otherwise serves
+# the memoized body or builds it; build returns (chunks, mimetype, headers)
+def cached_response(kind, build):
+    revision = user_repo().revision()
+    etag = f"{revision}-{kind}"
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    key = (request.path, request.query_string, kind, revision)
+    entry = response_cache.get(key)
+    if entry is None:
+        # concurrent misses for the same key and revision wait for one build
+        (entry, stream), shared = coalescer.do(key, lambda: build_entry(key, build))
+        if entry is None:
+            # too big to cache, a stream can't be shared so waiters build their own
+            if shared:
+                entry, stream = build_entry(key, build)
+            chunks, mimetype, extra = stream
+            return Response(chunks, mimetype=mimetype, headers={**headers, **extra})
+    body, mimetype, extra = entry
+    return Response(body, mimetype=mimetype, headers={**headers, **extra})
+
+# returns (entry, None) once the body is cached, or (None, stream) when it
+# was too big and has to be streamed
+def build_entry(key, build):
+    chunks, mimetype, extra = build()
+    body, rest = response_cache.collect(chunks)
+    if body is None:
+        return None, (rest, mimetype, extra)
+    entry = (body, mimetype, extra)
+    response_cache.put(key, entry, len(body))
+    return entry, None
+
+def build_user_listing(kind, rows, next_cursor=None, limit=None):
+    if kind == 'ndjson':
+        return user_core.stream_ndjson(rows), 'application/x-ndjson', {"X-Next-Cursor": next_cursor or ""}
+    if kind == 'json':
+        if limit is None:
+            return user_core.stream_json(rows), 'application/json', {}
+        return [json.dumps({"users": dict(rows), "next_cursor": next_cursor})], 'application/json', {}
+    next_page = next_cursor and f"/users/all?limit={limit}&cursor={next_cursor}"
+    return stream_html(rows, next_page), 'text/html', {}
 
 @app.route('/users/all', methods=['GET'])
+@rate_limited(listing_limiter, client_key)
 def get_all_users():
-    if request.is_json or request.headers.get('Accept') == 'application/json':
-        return jsonify(user), 200
-    html = "<h2>All Users</h2><ul>"
-    for name, info in user.items():
-        html += f"""
-        <li>
-            {name}: Age {info['age']}
-            <!-- Delete Form -->
-            <form action="/users/{name}" method="post" style="display:inline;">
-                <input type="hidden" name="_method" value="DELETE">
-                <input type="submit" value="Delete">
-            </form>
-
-            <!-- Update Form -->
-            <form action="/users/{name}" method="post" style="display:inline;">
-                <input type="hidden" name="_method" value="PUT">
-                <input type="number" name="age" placeholder="New Age">
-                <input type="submit" value="Update">
-            </form>
-        </li>
-        """
-    html += "</ul><a href='/users'>Create New User</a>"
-    return html
+    kind = response_kind()
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is None and cursor is None:
+        return cached_response(kind, lambda: build_user_listing(kind, user_core.iter_users(user_repo())))
+
+    error, limit, after = user_core.parse_page(limit, cursor)
+    if error:
+        return jsonify(error), 400
+
+    def build():
+        rows, next_cursor = user_core.list_page(user_repo(), after, limit)
+        return build_user_listing(kind, rows, next_cursor, limit)
+    return cached_response(kind, build)
 
 #addition: get a user
 @app.route('/users/<name>', methods=['GET'])
@@ -149,45 +267,59 @@ def get_user(name):
     error=validate_name(name)
     if error:
         return jsonify(error), 400
-    if name not in user:
-        return jsonify({"error": f"User {name} not found"}), 404
-    if request.is_json or request.headers.get('Accept') == 'application/json':
-        return jsonify(user[name]), 200
-    return f"""
-        <h2>User {name}</h2>
-        <p>Age: {user[name]['age']}</p>
-        <a href="/users/all">View All Users</a>
-    """, 200
+    kind = 'json' if request.is_json or request.headers.get('Accept') == 'application/json' else 'html'
+
+    # read inside build so the body is never older than the revision it is cached under
+    def build():
+        info, status = user_core.get_user(user_repo(), name)
+        if status != 200:
+            abort(make_response(jsonify(info), status))
+        if kind == 'json':
+            return [json.dumps(info)], 'application/json', {}
+        return [render_template('user_detail.html', name=name, age=info['age'])], 'text/html', {}
+    return cached_response(kind, build)
     
 @app.route('/search', methods=['GET'])
 def search_form():
-    return """
-        <h2>Search for a user</h2>
-        <form action="/search/result" method="get">
-            <label for="name">Enter name:</label>
-            <input type="text" id="name" name="name">
-            <input type="submit" value="Search">
-        </form>
-        <a href="/users/all">View All Users</a>
-    """
+    return static_page('search_form.html')
+
 @app.route('/search/result', methods=['GET'])
 def search_result():
     name = request.args.get("name")
     error = validate_name(name)
     if error:
         return jsonify(error), 400
+    mode = request.args.get("mode", "exact")
+    if mode in ("prefix", "fuzzy"):
+        return search_matches(name, mode)
+    if mode != "exact":
+        return jsonify({"error": "Mode must be exact, prefix or fuzzy"}), 400
 
-    if name not in user:
-        return f"<h2>User {name} not found</h2><a href='/search'>Search again</a>", 404
+    info = user_repo().get(name)
+    if info is None:
+        return render_template('search_missing.html', name=name), 404
     
-    return f"""
-        <h2>User {name}</h2>
-        <p>Age: {user[name]['age']}</p>
-        <a href="/search">Search again</a> |
-        <a href="/users/all">View All Users</a>
-    """
+    return render_template('user_detail.html', name=name, age=info['age'], search=True)
+
+def search_matches(name, mode):
+    try:
+        limit = min(int(request.args.get("limit", 10)), 100)
+    except ValueError:
+        return jsonify({"error": "Limit must be a valid integer"}), 400
+    if mode == "prefix":
+        names = user_repo().prefix(name, limit)
+    else:
+        names = user_repo().fuzzy(name, limit)
+    results = [(match, user_repo().get(match)) for match in names]
+    results = [(match, info) for match, info in results if info is not None]
+    if request.is_json or request.headers.get('Accept') == 'application/json':
+        return jsonify({"results": [{"name": match, "age": info["age"]} for match, info in results]}), 200
+    if not results:
+        return render_template('search_missing.html', name=name, matching=True), 404
+    return render_template('search_results.html', name=name, results=results)
 
 @app.route("/login", methods=["POST"])
+@rate_limited(login_limiter, login_key)
 def login():
     username = request.form.get("username") or (request.json and request.json.get("username"))
     password = request.form.get("password") or (request.json and request.json.get("password"))
@@ -195,10 +327,18 @@ def login():
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
 
-    if username in user:
-        if not check_password_hash(user[username]["password"], password):
+    info = user_repo().get(username)
+    if info is not None:
+        try:
+            matches, new_hash = hasher.verify(info["password"], password)
+        except HashPoolBusy:
+            return jsonify({"error": "Too many requests, try again later"}), 429, {"Retry-After": "1"}
+        if not matches:
             return jsonify({"error": "Invalid username or password"}), 401
         else:
+            if new_hash:
+                user_repo().update(username, {"password": new_hash})
+            session.regenerate()
             session['username']=username
             return redirect(url_for('dashboard'))
     else:
@@ -206,17 +346,8 @@ def login():
 
 @app.route("/login", methods=["GET"])
 def login_form():
-    return """
-        <h2> Login</h2>
-        <form action="/login" method="post">
-            <label for="username">Username:</label>
-            <input type="text" id="username" name="username"><br><br>
-            <label for="password">Password:</label>
-            <input type="password" id="password" name="password"><br><br>
-            <input type="submit" value="Login">
-            <p><a href="/signup">New here? Signup</a></p>
-        </form>
-    """
+    return static_page('login_form.html')
+
 @app.route("/secret",methods=['GET'])
 @login_required
 def secret():
@@ -233,38 +364,25 @@ def signup():
     password = request.form.get("password") or (request.json and request.json.get("password"))
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
-    if username in user:
+    if user_repo().exists(username):
+        return jsonify({"error": "Username already exists"}), 400
+    try:
+        hashed_password = hasher.hash(password)
+    except HashPoolBusy:
+        return jsonify({"error": "Too many requests, try again later"}), 429, {"Retry-After": "1"}
+    if not user_repo().create(username, {"age": None, "password": hashed_password}):
         return jsonify({"error": "Username already exists"}), 400
-    hashed_password = generate_password_hash(password)
-    user[username] = {"age": None, "password": hashed_password}
-    save_data()
     return jsonify({"message": "User created successfully"}), 201  
     
 @app.route('/signup', methods=['GET'])
 def signup_form():
-    return """
-        <h2> Signup</h2>
-        <form action="/signup" method="post">
-            <label for="username">Username:</label>
-            <input type="text" id="username" name="username"><br><br>
-            <label for="password">Password:</label>
-            <input type="password" id="password" name="password"><br><br>
-            <input type="submit" value="Signup">
-        </form>
-        <a href="/login">Already have an account? Login here</a>
-    """
+    return static_page('signup_form.html')
 
 @app.route("/dashboard")
 @login_required
 def dashboard():
     username=session['username']
-    return f"""
-            <h2>Welcome to your dashboard, {username}!</h2>
-            <p>This is a protected area.</p>
-            <a href="/secret">Go to Secret</a><br>
-            <a href="/users/all">View All Users</a><br>
-            <a href="/logout">Logout</a>
-        """
+    return render_template('dashboard.html', username=username)
     return redirect(url_for('login_form'))
 
 @app.route("/logout")
@@ -274,4 +392,4 @@ def logout():
     return redirect(url_for('login_form'))
         
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,67 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from metrics import HASH_SECONDS
+
+# full werkzeug method string including its cost parameters, e.g.
+# "scrypt:32768:8:1" or "pbkdf2:sha256:600000"; stored hashes made with a
+# different one are upgraded the next time their owner logs in
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.environ.get('HASH_QUEUE_LIMIT', HASH_WORKERS * 4))
+
+class HashPoolBusy(Exception):
+    pass
+
+def hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+def verify_password(stored, password, method):
+    if not check_password_hash(stored, password):
+        return False, None
+    if stored.split('$', 1)[0] != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+# runs the hashing in worker processes so it never holds the request
+# thread's GIL, and refuses work once queue_limit jobs are pending
+class PasswordHasher:
+    def __init__(self, method=HASH_METHOD, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT):
+        self.method = method
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(queue_limit)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    def get_pool(self):
+        # created on first use so a pre-forking server gets one pool per worker
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            future = self.get_pool().submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        return future.result()
+
+    def hash(self, password):
+        with HASH_SECONDS.time("hash"):
+            return self.run(hash_password, password, self.method)
+
+    # returns (matches, new_hash); new_hash is set when the stored hash
+    # was made with an outdated method and should be replaced
+    def verify(self, stored, password):
+        with HASH_SECONDS.time("verify"):
+            return self.run(verify_password, stored, password, self.method)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,52 @@
+import math
+from bisect import bisect_left, bisect_right, insort
+
+# items by id plus two secondary indexes: a sorted (price, id) list for
+# range queries and id sets per is_offer value. The FastAPI handlers all
+# run on one event loop and nothing here awaits, so every call is atomic.
+class ItemStore:
+    def __init__(self):
+        self.items = {}
+        self.by_price = []
+        self.by_offer = {True: set(), False: set(), None: set()}
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+    # NaN compares false with everything, bisect would then find and delete
+    # the wrong index entry
+    def check(self, item_id, item):
+        if not math.isfinite(item["price"]):
+            raise ValueError(f"Price of item {item_id} must be a finite number")
+
+    def put(self, item_id, item):
+        self.check(item_id, item)
+        old = self.items.get(item_id)
+        if old is not None:
+            del self.by_price[bisect_left(self.by_price, (old["price"], item_id))]
+            self.by_offer[old["is_offer"]].discard(item_id)
+        self.items[item_id] = item
+        insort(self.by_price, (item["price"], item_id))
+        self.by_offer[item["is_offer"]].add(item_id)
+
+    # stores nothing if any item is rejected
+    def put_many(self, items):
+        for item_id, item in items.items():
+            self.check(item_id, item)
+        for item_id, item in items.items():
+            self.put(item_id, item)
+
+    def query(self, min_price=None, max_price=None, offer_filter=False, is_offer=None, limit=100):
+        start = 0 if min_price is None else bisect_left(self.by_price, (min_price,))
+        end = len(self.by_price) if max_price is None else bisect_right(self.by_price, (max_price, float('inf')))
+        offer_ids = self.by_offer[is_offer] if offer_filter else None
+        # walk whichever index narrows the result down more
+        if offer_ids is not None and len(offer_ids) < end - start:
+            ids = sorted(offer_ids, key=lambda item_id: (self.items[item_id]["price"], item_id))
+            matches = [item_id for item_id in ids
+                       if (min_price is None or self.items[item_id]["price"] >= min_price)
+                       and (max_price is None or self.items[item_id]["price"] <= max_price)]
+        else:
+            matches = [item_id for price, item_id in self.by_price[start:end]
+                       if offer_ids is None or item_id in offer_ids]
+        return [(item_id, self.items[item_id]) for item_id in matches[:limit]]
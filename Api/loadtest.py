@@ -0,0 +1,171 @@
+import argparse
+import json, os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+# starts dynamic_user.py on a scratch data directory, seeds it and drives a
+# mixed workload, then writes throughput and latency percentiles per route:
+#   python loadtest.py --users 10000 --concurrency 16 --duration 30
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+DEFAULT_MIX = "get=50,list=10,create=10,update=15,delete=5,login=10"
+ACCOUNTS = 20
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        route, weight = part.split('=')
+        mix[route.strip()] = float(weight)
+    return mix
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def start_server(port, data_dir, store):
+    # the per-client rate limits would otherwise turn most of the load into 429s
+    limits = {name: '1000000' for name in ('LOGIN_RATE', 'LOGIN_BURST', 'LISTING_RATE', 'LISTING_BURST')}
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='0', USER_STORE=store, **limits)
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'dynamic_user.py')],
+                              cwd=data_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/login", timeout=1)
+            return server, base_url
+        except requests.exceptions.ConnectionError:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not start in time")
+
+def seed(base_url, count):
+    with requests.Session() as s:
+        for start in range(0, count, 5000):
+            rows = [{"name": f"user{i}", "age": i % 90 + 10} for i in range(start, min(count, start + 5000))]
+            s.post(f"{base_url}/users/bulk", json=rows, headers=JSON_HEADERS).raise_for_status()
+        for i in range(ACCOUNTS):
+            s.post(f"{base_url}/signup", json={"username": f"account{i}", "password": "secret"},
+                   headers=JSON_HEADERS)
+
+class Workload:
+    def __init__(self, base_url, users, mix):
+        self.base_url = base_url
+        self.users = users
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.next_name = 0
+        self.lock = threading.Lock()
+
+    def fresh_name(self):
+        with self.lock:
+            self.next_name += 1
+            return f"load{self.next_name}"
+
+    def run(self, s, rnd, route):
+        url = self.base_url
+        if route == "get":
+            return s.get(f"{url}/users/user{rnd.randrange(self.users)}", headers=JSON_HEADERS)
+        if route == "list":
+            return s.get(f"{url}/users/all", params={"limit": 100}, headers=JSON_HEADERS)
+        if route == "create":
+            return s.post(f"{url}/users", json={"name": self.fresh_name(), "age": 30}, headers=JSON_HEADERS)
+        if route == "update":
+            return s.put(f"{url}/users/user{rnd.randrange(self.users)}",
+                         json={"age": rnd.randint(10, 99)}, headers=JSON_HEADERS)
+        if route == "delete":
+            # deletes only the users this run created so reads keep hitting
+            name = self.fresh_name()
+            s.post(f"{url}/users", json={"name": name, "age": 30}, headers=JSON_HEADERS)
+            return s.delete(f"{url}/users/{name}", headers=JSON_HEADERS)
+        if route == "login":
+            return s.post(f"{url}/login", json={"username": f"account{rnd.randrange(ACCOUNTS)}",
+                                                "password": "secret"},
+                          headers=JSON_HEADERS, allow_redirects=False)
+        raise ValueError(f"Unknown route {route}")
+
+def drive(workload, seed_value, stop_at, samples, failures):
+    rnd = random.Random(seed_value)
+    with requests.Session() as s:
+        while time.time() < stop_at:
+            route = rnd.choices(workload.routes, workload.weights)[0]
+            start = time.perf_counter()
+            try:
+                response = workload.run(s, rnd, route)
+                ok = response.status_code < 400
+            except requests.exceptions.RequestException:
+                ok = False
+            samples[route].append(time.perf_counter() - start)
+            if not ok:
+                failures.append(route)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Flask user API")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--store", choices=["log", "sqlite"], default="log")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    data_dir = tempfile.mkdtemp()
+    server, base_url = start_server(args.port, data_dir, args.store)
+    try:
+        seed(base_url, args.users)
+        workload = Workload(base_url, args.users, mix)
+        samples = {route: [] for route in mix}
+        failures = []
+        stop_at = time.time() + args.duration
+        threads = [threading.Thread(target=drive, args=(workload, i, stop_at, samples, failures))
+                   for i in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 3),
+        "store": args.store,
+        "total_requests": sum(len(values) for values in samples.values()),
+        "routes": {},
+    }
+    report["throughput_rps"] = round(report["total_requests"] / elapsed, 1)
+    for route, values in samples.items():
+        values.sort()
+        report["routes"][route] = {
+            "requests": len(values),
+            "errors": failures.count(route),
+            "throughput_rps": round(len(values) / elapsed, 1),
+            **{f"p{p}_ms": values and round(percentile(values, p) * 1000, 3) for p in (50, 95, 99)},
+        }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"{report['total_requests']} requests in {elapsed:.1f}s ({report['throughput_rps']} req/s)")
+    for route, stats in report["routes"].items():
+        print(f"{route:>7}: {stats['requests']:>7} req  p50 {stats['p50_ms']} ms  "
+              f"p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms  errors {stats['errors']}")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,119 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import atexit
+import os
+import threading
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from item_store import ItemStore
+from repository import SQLiteUserRepository, UserRepository
+import user_core
+# routes with a response_model are serialized straight to JSON bytes by
+# pydantic, no custom response class needed
 app = FastAPI()
+store = ItemStore()
+users = None
+users_lock = threading.Lock()
+
+# always sqlite: the log store has a single writer and dynamic_user.py may
+# already own it. Opened on the first user request so importing this module
+# (e.g. bench_items.py) touches no user data. Run dynamic_user.py with
+# USER_STORE=sqlite to serve the same users from both apps.
+def user_store():
+    global users
+    with users_lock:
+        if users is None:
+            users = SQLiteUserRepository(os.environ.get('USER_DB_FILE', 'users.db'))
+            atexit.register(users.close)
+    return users
 
 class Item(BaseModel):
     name:  str
-    price: float
+    # NaN would break the ordering of the store's price index
+    price: float = Field(allow_inf_nan=False)
     is_offer: bool | None=None
 
+class StoredItem(Item):
+    item_id: int
+
+class ItemRead(StoredItem):
+    q: str | None=None
+
+class ItemPut(BaseModel):
+    item_name: str
+    item_id: int
+
+class ItemsPut(BaseModel):
+    stored: int
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"Item":"Value"}
 
-@app.get("/items/{item_id}")
-def read_item(item_id: int, q: str | None = None):
-    return {"item_id": item_id, "q": q}
+@app.get("/items/{item_id}", response_model=ItemRead)
+async def read_item(item_id: int, q: str | None = None):
+    item = store.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
+    return ItemRead(item_id=item_id, q=q, **item)
+
+# range and filter lookups over the price and is_offer indexes; pass
+# is_offer=true/false to filter, leave it out to match every item
+@app.get("/items", response_model=list[StoredItem])
+async def query_items(min_price: float | None = Query(None, allow_inf_nan=False),
+                      max_price: float | None = Query(None, allow_inf_nan=False),
+                      is_offer: bool | None = None, limit: int = 100):
+    results = store.query(min_price, max_price, is_offer is not None, is_offer, min(limit, 1000))
+    return [StoredItem(item_id=item_id, **item) for item_id, item in results]
+
+@app.put("/item/{item_id}", response_model=ItemPut)
+async def put_item(item_id: int, item: Item):
+    store.put(item_id, item.model_dump())
+    return ItemPut(item_name=item.name, item_id=item_id)
+
+@app.put("/items", response_model=ItemsPut)
+async def put_items(items: dict[int, Item]):
+    store.put_many({item_id: item.model_dump() for item_id, item in items.items()})
+    return ItemsPut(stored=len(items))
+
+# the user routes keep the Flask app's JSON contract; repository calls block
+# on disk, so they run in the threadpool
+def reply(result):
+    payload, status = result
+    return JSONResponse(payload, status_code=status)
+
+async def read_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return data if isinstance(data, dict) else {}
+
+@app.post("/users")
+async def create_user(request: Request, users: UserRepository = Depends(user_store)):
+    data = await read_body(request)
+    return reply(await run_in_threadpool(user_core.create_user, users, data.get("name"), data.get("age")))
+
+@app.get("/users/all")
+async def get_all_users(limit: str | None = None, cursor: str | None = None,
+                        users: UserRepository = Depends(user_store)):
+    if limit is None and cursor is None:
+        return StreamingResponse(user_core.stream_json(user_core.iter_users(users)), media_type="application/json")
+    error, limit, after = user_core.parse_page(limit, cursor)
+    if error:
+        return reply((error, 400))
+    rows, next_cursor = await run_in_threadpool(user_core.list_page, users, after, limit)
+    return reply(({"users": dict(rows), "next_cursor": next_cursor}, 200))
+
+@app.get("/users/{name}")
+async def get_user(name: str, users: UserRepository = Depends(user_store)):
+    return reply(await run_in_threadpool(user_core.get_user, users, name))
+
+@app.put("/users/{name}")
+async def update_user(name: str, request: Request, users: UserRepository = Depends(user_store)):
+    data = await read_body(request)
+    return reply(await run_in_threadpool(user_core.update_user, users, name, data.get("age")))
 
-@app.put("/item/{item_id}")
-def put_item(item_id: int, item: Item):
-    return {"item_name": item.name, "item_id": item_id}
+@app.delete("/users/{name}")
+async def delete_user(name: str, users: UserRepository = Depends(user_store)):
+    return reply(await run_in_threadpool(user_core.delete_user, users, name))
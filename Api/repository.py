@@ -0,0 +1,399 @@
+import os
+import sqlite3
+from bisect import bisect_left, bisect_right, insort
+import threading
+import time
+from user_log import UserLog
+from metrics import PERSIST_SECONDS
+from sqlite_conn import local_connection
+from search_index import MAX_CANDIDATES, POSTINGS_BUDGET, NameIndex, closest, hits_needed, plan, rarest, trigrams
+
+# every write is a single atomic step so concurrent handlers can't lose an
+# update between checking for a user and writing it
+
+class UserRepository:
+    def get(self, name):
+        raise NotImplementedError
+
+    def exists(self, name):
+        return self.get(name) is not None
+
+    # adds the user unless the name is taken, returns whether it was added
+    def create(self, name, data):
+        raise NotImplementedError
+
+    # merges changes into an existing user, returns False if there is none
+    def update(self, name, changes):
+        raise NotImplementedError
+
+    # merges every (name, changes) pair as a single batch, creating missing
+    # users, and returns how many were created
+    def upsert_many(self, rows):
+        raise NotImplementedError
+
+    # returns whether the user existed
+    def delete(self, name):
+        raise NotImplementedError
+
+    def items(self):
+        raise NotImplementedError
+
+    # up to `limit` users ordered by name, starting after the name `after`
+    def page(self, after=None, limit=100):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    # up to `limit` names starting with prefix, ignoring case
+    def prefix(self, prefix, limit=10):
+        raise NotImplementedError
+
+    # up to `limit` names within a few typos of query, closest first
+    def fuzzy(self, query, limit=10):
+        raise NotImplementedError
+
+    # increases on every write, used to validate cached responses
+    def revision(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# in-memory dict persisted through the append-only log, single process only.
+# Writers are serialized by a lock and then wait for the log's group commit
+# outside it. Readers never lock: single dict operations are atomic and the
+# sorted name list is copied on write, so a page always sees one version.
+class LogUserRepository(UserRepository):
+    def __init__(self, data_file):
+        self.log = UserLog(data_file)
+        self.users = self.log.load()
+        self.names = sorted(self.users)
+        # the revision isn't persisted, so each process starts from its own
+        # clock reading; ETags handed out before a restart can then never match
+        self.rev = time.time_ns()
+        self.lock = threading.Lock()
+        # built on the first search so startup stays a plain log replay
+        self.index = None
+
+    def get(self, name):
+        return self.users.get(name)
+
+    def exists(self, name):
+        return name in self.users
+
+    def create(self, name, data):
+        with self.lock:
+            if name in self.users:
+                return False
+            names = self.names[:]
+            insort(names, name)
+            self.users[name] = data
+            self.names = names
+            self.rev += 1
+            if self.index is not None:
+                self.index.add(name)
+            ticket = self.log.submit([name])
+        self.log.wait(ticket)
+        return True
+
+    def update(self, name, changes):
+        with self.lock:
+            if name not in self.users:
+                return False
+            self.users[name] = {**self.users[name], **changes}
+            self.rev += 1
+            ticket = self.log.submit([name])
+        self.log.wait(ticket)
+        return True
+
+    def upsert_many(self, rows):
+        with self.lock:
+            new_names = []
+            for name, changes in rows:
+                if name not in self.users:
+                    new_names.append(name)
+                self.users[name] = {**self.users.get(name, {}), **changes}
+            if new_names:
+                self.names = sorted(self.names + new_names)
+                if self.index is not None:
+                    self.index.add_many(new_names)
+            self.rev += 1
+            ticket = self.log.submit([name for name, changes in rows])
+        self.log.wait(ticket)
+        return len(new_names)
+
+    def delete(self, name):
+        with self.lock:
+            if name not in self.users:
+                return False
+            names = self.names[:]
+            del names[bisect_left(names, name)]
+            del self.users[name]
+            self.names = names
+            self.rev += 1
+            if self.index is not None:
+                self.index.remove(name)
+            ticket = self.log.submit([name])
+        self.log.wait(ticket)
+        return True
+
+    def items(self):
+        return list(self.users.items())
+
+    def page(self, after=None, limit=100):
+        names = self.names
+        start = 0 if after is None else bisect_right(names, after)
+        rows = []
+        for name in names[start:start + limit]:
+            data = self.users.get(name)
+            if data is not None:
+                rows.append((name, data))
+        return rows
+
+    def count(self):
+        return len(self.users)
+
+    def search_index(self):
+        if self.index is None:
+            # writers wait while it is built so none can be missed
+            with self.lock:
+                if self.index is None:
+                    self.index = NameIndex(self.names)
+        return self.index
+
+    def prefix(self, prefix, limit=10):
+        return self.search_index().prefix(prefix, limit)
+
+    def fuzzy(self, query, limit=10):
+        return self.search_index().fuzzy(query, limit)
+
+    def revision(self):
+        return self.rev
+
+    def close(self):
+        self.log.close()
+
+COLUMNS = ("age", "password")
+# names given trigram rows per transaction by the background indexer
+GRAM_CHUNK = 5000
+
+# one sqlite file shared by every worker process, each thread keeps its own
+# connection open for the life of the worker
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+        self.indexing = threading.Event()
+        self.stopping = False
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    name TEXT PRIMARY KEY,
+                    age,
+                    password TEXT
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            # a recreated database starts from the clock, not 0, so ETags
+            # handed out for an earlier one never match
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', ?)", (time.time_ns(),))
+            # search tables shared by every worker: a case-insensitive name
+            # index for prefixes and trigram postings for fuzzy lookups
+            conn.execute("CREATE INDEX IF NOT EXISTS users_name_nocase ON users (name COLLATE NOCASE)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS name_grams (
+                    gram TEXT,
+                    length INTEGER,
+                    name TEXT,
+                    PRIMARY KEY (gram, length, name)
+                ) WITHOUT ROWID
+            """)
+            # writes only note new names here, about ten trigram rows each
+            # are added by the indexer thread outside the writer's transaction
+            conn.execute("CREATE TABLE IF NOT EXISTS pending_grams (name TEXT PRIMARY KEY) WITHOUT ROWID")
+            # stores created before the trigram table get it filled once
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'name_grams'").fetchone() is None:
+                conn.execute("INSERT OR IGNORE INTO pending_grams (name) SELECT name FROM users")
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('name_grams', 1)")
+        # picks up whatever an earlier process left pending
+        self.indexer = threading.Thread(target=self.index_forever, daemon=True)
+        self.indexer.start()
+        self.indexing.set()
+
+    def connect(self):
+        return local_connection(self.local, self.db_file)
+
+    def to_dict(self, row):
+        data = {"age": row[0]}
+        if row[1] is not None:
+            data["password"] = row[1]
+        return data
+
+    # shares the revision between workers, bumped in the writing transaction
+    def bump(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def gram_rows(self, names):
+        for name in names:
+            key = name.lower()
+            for gram in trigrams(key):
+                yield gram, len(key), name
+
+    def add_grams(self, conn, names):
+        conn.executemany("INSERT OR IGNORE INTO name_grams (gram, length, name) VALUES (?, ?, ?)",
+                         sorted(self.gram_rows(names)))
+
+    def index_forever(self):
+        while True:
+            self.indexing.wait()
+            self.indexing.clear()
+            if self.stopping:
+                self.close_connection()
+                return
+            try:
+                self.index_pending()
+            except sqlite3.Error:
+                # the names stay pending and fuzzy() still scans them, the
+                # next write retries
+                pass
+
+    # moves pending names into the trigram table a chunk per transaction, so
+    # writers in other workers get the lock in between
+    def index_pending(self):
+        conn = self.connect()
+        while not self.stopping:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                names = [row[0] for row in conn.execute("SELECT name FROM pending_grams LIMIT ?", (GRAM_CHUNK,))]
+                self.add_grams(conn, names)
+                conn.executemany("DELETE FROM pending_grams WHERE name = ?", [(name,) for name in names])
+            if len(names) < GRAM_CHUNK:
+                return
+
+    def get(self, name):
+        row = self.connect().execute(
+            "SELECT age, password FROM users WHERE name = ?", (name,)).fetchone()
+        return self.to_dict(row) if row else None
+
+    def create(self, name, data):
+        with PERSIST_SECONDS.time("sqlite"), self.connect() as conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO users (name, age, password) VALUES (?, ?, ?)",
+                (name, data.get("age"), data.get("password"))).rowcount == 1
+            if added:
+                conn.execute("INSERT OR IGNORE INTO pending_grams (name) VALUES (?)", (name,))
+                self.bump(conn)
+        if added:
+            self.indexing.set()
+        return added
+
+    def update(self, name, changes):
+        columns = [column for column in COLUMNS if column in changes]
+        if not columns:
+            return self.exists(name)
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with PERSIST_SECONDS.time("sqlite"), self.connect() as conn:
+            found = conn.execute(
+                f"UPDATE users SET {assignments} WHERE name = ?",
+                [changes[column] for column in columns] + [name]).rowcount == 1
+            if found:
+                self.bump(conn)
+        return found
+
+    def upsert_many(self, rows):
+        with PERSIST_SECONDS.time("sqlite"), self.connect() as conn:
+            # notes the names that are about to be created
+            conn.executemany(
+                "INSERT OR IGNORE INTO pending_grams (name) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM users WHERE name = ?)",
+                [(name, name) for name, changes in rows])
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (name, age, password) VALUES (?, ?, ?)",
+                [(name, changes.get("age"), changes.get("password")) for name, changes in rows])
+            created = conn.total_changes - before
+            for column in COLUMNS:
+                updates = [(changes[column], name) for name, changes in rows if column in changes]
+                if updates:
+                    conn.executemany(f"UPDATE users SET {column} = ? WHERE name = ?", updates)
+            self.bump(conn)
+        if created:
+            self.indexing.set()
+        return created
+
+    def delete(self, name):
+        with PERSIST_SECONDS.time("sqlite"), self.connect() as conn:
+            found = conn.execute("DELETE FROM users WHERE name = ?", (name,)).rowcount == 1
+            if found:
+                conn.executemany("DELETE FROM name_grams WHERE gram = ? AND length = ? AND name = ?",
+                                 self.gram_rows([name]))
+                conn.execute("DELETE FROM pending_grams WHERE name = ?", (name,))
+                self.bump(conn)
+        return found
+
+    def items(self):
+        rows = self.connect().execute("SELECT name, age, password FROM users ORDER BY name")
+        return [(row[0], self.to_dict(row[1:])) for row in rows]
+
+    def page(self, after=None, limit=100):
+        rows = self.connect().execute(
+            "SELECT name, age, password FROM users WHERE name > ? ORDER BY name LIMIT ?",
+            ('' if after is None else after, limit))
+        return [(row[0], self.to_dict(row[1:])) for row in rows]
+
+    def count(self):
+        return self.connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def prefix(self, prefix, limit=10):
+        key = prefix.lower()
+        # NOCASE only folds ascii, so the range may include a few names the
+        # check below drops
+        rows = self.connect().execute(
+            "SELECT name FROM users WHERE name >= ? COLLATE NOCASE ORDER BY name COLLATE NOCASE LIMIT ?",
+            (prefix, limit))
+        return [row[0] for row in rows if row[0].lower().startswith(key)]
+
+    def fuzzy(self, query, limit=10):
+        key, max_distance, grams, lengths, missable = plan(query)
+        conn = self.connect()
+        if missable is None:
+            rows = conn.execute("SELECT name FROM users WHERE length(name) BETWEEN ? AND ?",
+                                (lengths[0], lengths[-1]))
+            return closest(key, [row[0] for row in rows], max_distance, limit)
+        # counting stops past the budget, rarest() never reads more than that
+        sizes = [conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM name_grams WHERE gram = ? AND length BETWEEN ? AND ? LIMIT ?)",
+            (gram, lengths[0], lengths[-1], POSTINGS_BUDGET + 1)).fetchone()[0] for gram in grams]
+        chosen = [grams[i] for i in rarest(sizes, missable)]
+        # names the indexer hasn't reached yet are checked directly; read
+        # first, so a name indexed in between is found in the trigram table
+        pending = [row[0] for row in conn.execute(
+            "SELECT name FROM pending_grams WHERE length(name) BETWEEN ? AND ?", (lengths[0], lengths[-1]))]
+        marks = ", ".join("?" * len(chosen))
+        rows = conn.execute(
+            f"SELECT name FROM name_grams WHERE gram IN ({marks}) AND length BETWEEN ? AND ? "
+            "GROUP BY name HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC, name LIMIT ?",
+            chosen + [lengths[0], lengths[-1], hits_needed(chosen, missable), MAX_CANDIDATES])
+        return closest(key, [row[0] for row in rows] + pending, max_distance, limit)
+
+    def revision(self):
+        return self.connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def close(self):
+        # pending names stay in the table for the next process to index
+        self.stopping = True
+        self.indexing.set()
+        self.indexer.join()
+        self.close_connection()
+
+    def close_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+def make_repository():
+    backend = os.environ.get('USER_STORE', 'log')
+    if backend == 'sqlite':
+        return SQLiteUserRepository(os.environ.get('USER_DB_FILE', 'users.db'))
+    return LogUserRepository(os.environ.get('USER_DATA_FILE', 'users.json'))
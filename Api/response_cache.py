@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from itertools import chain
+
+# memoized response bodies keyed by (route, query, representation, store
+# revision), the revision always last; storing an entry of a newer revision
+# drops every older one since no request can reach them again, and the LRU
+# keeps the rest under both an entry and a byte budget
+
+MAX_ENTRIES = 1024
+MAX_BODY_BYTES = 1024 * 1024
+MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_body_bytes=MAX_BODY_BYTES, max_total_bytes=MAX_TOTAL_BYTES):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.max_total_bytes = max_total_bytes
+        # key -> (size, entry)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.revision = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            found = self.entries.get(key)
+            if found is None:
+                return None
+            self.entries.move_to_end(key)
+            return found[1]
+
+    # size is the body's length in bytes
+    def put(self, key, entry, size):
+        revision = key[-1]
+        with self.lock:
+            if self.revision is not None and revision < self.revision:
+                # built from a store state that has already moved on
+                return
+            if revision != self.revision:
+                self.entries.clear()
+                self.size = 0
+                self.revision = revision
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            self.entries[key] = (size, entry)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_total_bytes:
+                self.size -= self.entries.popitem(last=False)[1][0]
+
+    # joins a chunk generator into one body if it stays under the size cap,
+    # otherwise hands back a generator that streams the remainder
+    def collect(self, chunks):
+        # a list would be replayed from the start by chain() below
+        chunks = iter(chunks)
+        collected = []
+        size = 0
+        for chunk in chunks:
+            collected.append(chunk)
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return None, chain(collected, chunks)
+        return ''.join(collected).encode(), None
@@ -0,0 +1,230 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# case-insensitive name index: a sorted key list for prefix lookups and
+# trigram posting lists, split by name length, for typo tolerant ones
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# an edit changes at most three of a key's trigrams, swapping two
+# neighbouring characters at most four
+GRAMS_PER_EDIT = 4
+# most candidates checked per query, those sharing the most trigrams first;
+# bounds the work when many names share long substrings
+MAX_CANDIDATES = 500
+# most posting entries read per query once the rarest list is in
+POSTINGS_BUDGET = 10000
+
+# bit masks of the positions of each character of key, for osa_distance
+def char_masks(key):
+    masks = {}
+    for i, c in enumerate(key):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+# optimal string alignment distance: inserting, deleting or replacing a
+# character and swapping two neighbouring ones each count as one edit.
+# Bit-parallel (Hyyro 2003): one pass over text, the whole column of the
+# distance table for key packed into an int
+def osa_distance(key, masks, text):
+    if not key:
+        return len(text)
+    full = (1 << len(key)) - 1
+    last = 1 << (len(key) - 1)
+    vp, vn, d0, prev, distance = full, 0, 0, 0, len(key)
+    for c in text:
+        pm = masks.get(c, 0)
+        swapped = (((~d0) & pm) << 1) & prev
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | swapped) & full
+        hp = (vn | ~(d0 | vp)) & full
+        hn = d0 & vp
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = (hn | ~(d0 | hp)) & full
+        vn = d0 & hp
+        prev = pm
+    return distance
+
+# typos allowed for a query of this length when the caller doesn't say;
+# short queries get fewer so the trigram filter below never becomes vacuous
+def default_distance(key):
+    if len(key) <= 3:
+        return 0
+    return 1 if len(key) <= 7 else 2
+
+# a name within max_distance edits shares at least this many of the
+# query's trigrams
+def shared_needed(grams, max_distance):
+    return len(grams) - GRAMS_PER_EDIT * max_distance
+
+def trigram_counts(key):
+    padded = f"  {key} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+# keeps the names within max_distance edits of key, closest first
+def closest(key, candidates, max_distance, limit):
+    grams = trigrams(key)
+    needed = shared_needed(grams, max_distance)
+    # keys with repeated trigrams (e.g. 'zzzzzzzz') have too few distinct
+    # ones for the check above, so count occurrences instead
+    counts = trigram_counts(key) if needed <= 0 else None
+    occurrences_needed = len(key) + 1 - GRAMS_PER_EDIT * max_distance
+    masks = char_masks(key)
+    matches = []
+    for name in candidates:
+        lowered = name.lower()
+        if abs(len(lowered) - len(key)) > max_distance:
+            continue
+        if needed > 0:
+            if len(grams & trigrams(lowered)) < needed:
+                continue
+        elif occurrences_needed > 0 and sum((counts & trigram_counts(lowered)).values()) < occurrences_needed:
+            continue
+        distance = osa_distance(key, masks, lowered)
+        if distance <= max_distance:
+            matches.append((distance, name))
+    matches.sort()
+    return [name for distance, name in matches[:limit]]
+
+# the names found in at least `needed` of the posting lists read, given as
+# {name: lists it was in}, capped at MAX_CANDIDATES: most lists first, then
+# by name so the cut is the same every time
+def best_candidates(hits, needed):
+    by_count = {}
+    for name, count in hits.items():
+        if count >= needed:
+            by_count.setdefault(count, []).append(name)
+    candidates = []
+    for count in sorted(by_count, reverse=True):
+        names = by_count[count]
+        if len(candidates) + len(names) > MAX_CANDIDATES:
+            names = sorted(names)[:MAX_CANDIDATES - len(candidates)]
+        candidates += names
+        if len(candidates) == MAX_CANDIDATES:
+            break
+    return candidates
+
+class NameIndex:
+    def __init__(self, names=()):
+        self.lock = threading.Lock()
+        self.keys = sorted({(name.lower(), name) for name in names})
+        # gram -> key length -> names
+        self.grams = {}
+        self.lengths = {}
+        for key, name in self.keys:
+            self.post(key, name)
+
+    def post(self, key, name):
+        self.lengths.setdefault(len(key), set()).add(name)
+        for gram in trigrams(key):
+            self.grams.setdefault(gram, {}).setdefault(len(key), set()).add(name)
+
+    def add(self, name):
+        key = name.lower()
+        with self.lock:
+            i = bisect_left(self.keys, (key, name))
+            if i < len(self.keys) and self.keys[i] == (key, name):
+                return
+            self.keys.insert(i, (key, name))
+            self.post(key, name)
+
+    def add_many(self, names):
+        entries = {(name.lower(), name) for name in names}
+        with self.lock:
+            new = []
+            for entry in entries:
+                i = bisect_left(self.keys, entry)
+                if i == len(self.keys) or self.keys[i] != entry:
+                    new.append(entry)
+            self.keys = sorted(self.keys + new)
+            for key, name in new:
+                self.post(key, name)
+
+    def remove(self, name):
+        key = name.lower()
+        with self.lock:
+            i = bisect_left(self.keys, (key, name))
+            if i == len(self.keys) or self.keys[i] != (key, name):
+                return
+            del self.keys[i]
+            self.lengths[len(key)].discard(name)
+            for gram in trigrams(key):
+                by_length = self.grams.get(gram)
+                if by_length is None:
+                    continue
+                names = by_length.get(len(key))
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del by_length[len(key)]
+                if not by_length:
+                    del self.grams[gram]
+
+    def prefix(self, prefix, limit=10):
+        key = prefix.lower()
+        with self.lock:
+            i = bisect_left(self.keys, (key,))
+            found = self.keys[i:i + limit]
+        return [name for k, name in found if k.startswith(key)]
+
+    def fuzzy(self, query, limit=10, max_distance=None):
+        key, max_distance, grams, lengths, missable = plan(query, max_distance)
+        # only the chosen posting lists are copied under the lock, counting
+        # and checking run outside it
+        with self.lock:
+            if missable is not None:
+                postings = [[by_length[n] for n in lengths if n in by_length]
+                            for by_length in (self.grams.get(gram, {}) for gram in grams)]
+                chosen = rarest([sum(map(len, lists)) for lists in postings], missable)
+                lists = [list(names) for i in chosen for names in postings[i]]
+            else:
+                lists = [list(self.lengths.get(n, ())) for n in lengths]
+        if missable is None:
+            return closest(key, [name for names in lists for name in names], max_distance, limit)
+        hits = Counter()
+        for names in lists:
+            hits.update(names)
+        return closest(key, best_candidates(hits, hits_needed(chosen, missable)), max_distance, limit)
+
+# returns (key, max_distance, trigrams, key lengths to look at, missable):
+# a match is missing at most `missable` of the distinct trigrams, or
+# missable is None when the query is too short for trigrams to narrow it
+def plan(query, max_distance=None):
+    key = query.lower()
+    if max_distance is None:
+        max_distance = default_distance(key)
+    grams = sorted(trigrams(key))
+    lengths = range(max(len(key) - max_distance, 0), len(key) + max_distance + 1)
+    # the padded key has len(key) + 1 trigrams and each edit destroys at
+    # most GRAMS_PER_EDIT, so past that a match still shares at least one
+    if len(key) + 1 <= GRAMS_PER_EDIT * max_distance:
+        return key, max_distance, grams, lengths, None
+    return key, max_distance, grams, lengths, min(GRAMS_PER_EDIT * max_distance, len(grams) - 1)
+
+# indexes of the posting lists to read given their sizes, rarest first: any
+# missable + 1 of them must contain every match, and reading a few more
+# rare ones lets the count require more than one hit. Past POSTINGS_BUDGET
+# entries only the rarest list is still read, so when names share a long
+# common part matches are looked for among those in the rare lists only
+def rarest(sizes, missable):
+    sizes = sorted((size, i) for i, size in enumerate(sizes))
+    budget = min(3 * sum(size for size, i in sizes[:missable + 1]) + 64, POSTINGS_BUDGET)
+    chosen = 1
+    total = sizes[0][0]
+    while chosen < len(sizes) and (chosen <= missable or total + sizes[chosen][0] <= budget):
+        if total + sizes[chosen][0] > POSTINGS_BUDGET:
+            break
+        total += sizes[chosen][0]
+        chosen += 1
+    return [i for size, i in sizes[:chosen]]
+
+# every match is in at least this many of the lists rarest() picked
+def hits_needed(chosen, missable):
+    return max(len(chosen) - missable, 1)
@@ -0,0 +1,257 @@
+import json, os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from sqlite_conn import local_connection
+
+# server-side sessions: the cookie only carries a signed session id, the
+# data lives in a store shared by every worker and survives restarts
+
+# the first worker to start creates the key file, owner-only; workers that
+# lose the race read the winner's key so every worker signs with the same one
+def load_secret_key(path):
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    except FileExistsError:
+        # the creator may not have written the key yet
+        for attempt in range(50):
+            with open(path, 'r') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise RuntimeError(f"Secret key file {path} is empty")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
+class SessionStore:
+    def load(self, sid):
+        raise NotImplementedError
+
+    def save(self, sid, data, expires):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    # drops every session whose expiry has passed
+    def sweep(self):
+        raise NotImplementedError
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def connect(self):
+        return local_connection(self.local, self.db_file)
+
+    def load(self, sid):
+        row = self.connect().execute(
+            "SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, sid, data, expires):
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                         (sid, json.dumps(data), expires))
+
+    def delete(self, sid):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def sweep(self):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+# one json file per session, for setups without sqlite on shared storage
+class FileSessionStore(SessionStore):
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sid):
+        return os.path.join(self.directory, sid + '.json')
+
+    def load(self, sid):
+        try:
+            with open(self.path(sid), 'r') as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if record["expires"] < time.time():
+            return None
+        return record["data"], record["expires"]
+
+    def save(self, sid, data, expires):
+        tmp = self.path(sid) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({"data": data, "expires": expires}, f)
+        os.replace(tmp, self.path(sid))
+
+    def delete(self, sid):
+        try:
+            os.remove(self.path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        for entry in os.listdir(self.directory):
+            if entry.endswith('.json') and self.load(entry[:-5]) is None:
+                self.delete(entry[:-5])
+
+# in-process LRU in front of a shared store; entries are trusted for
+# `fresh_for` seconds before being re-read, which bounds how long another
+# worker's logout can go unnoticed
+class CachedSessionStore(SessionStore):
+    def __init__(self, store, max_entries=10000, fresh_for=5):
+        self.store = store
+        self.max_entries = max_entries
+        self.fresh_for = fresh_for
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, sid):
+        now = time.time()
+        with self.lock:
+            entry = self.cache.get(sid)
+            if entry is not None:
+                data, expires, checked = entry
+                if expires >= now and now - checked < self.fresh_for:
+                    self.cache.move_to_end(sid)
+                    return data, expires
+        record = self.store.load(sid)
+        if record is None:
+            with self.lock:
+                self.cache.pop(sid, None)
+            return None
+        self.remember(sid, record[0], record[1])
+        return record
+
+    def remember(self, sid, data, expires):
+        with self.lock:
+            self.cache[sid] = (data, expires, time.time())
+            self.cache.move_to_end(sid)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def save(self, sid, data, expires):
+        self.store.save(sid, data, expires)
+        self.remember(sid, data, expires)
+
+    def delete(self, sid):
+        self.store.delete(sid)
+        with self.lock:
+            self.cache.pop(sid, None)
+
+    def sweep(self):
+        now = time.time()
+        with self.lock:
+            for sid in [sid for sid, entry in self.cache.items() if entry[1] < now]:
+                del self.cache[sid]
+        self.store.sweep()
+
+def start_sweeper(store, interval=300):
+    def sweep_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                store.sweep()
+            except Exception as e:
+                print(f"Session sweep failed: {e}")
+    thread = threading.Thread(target=sweep_forever, daemon=True)
+    thread.start()
+    return thread
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.replaced_sid = None
+
+    # moves the data to a fresh session id, call it whenever the session
+    # gains privileges (login) so a session id planted before can't follow
+    def regenerate(self):
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self.signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            record = sid and self.store.load(sid)
+            if record:
+                return ServerSideSession(record[0], sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, dict(session), expires)
+        response.set_cookie(
+            name,
+            self.signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+def make_session_interface():
+    backend = os.environ.get('SESSION_STORE', 'sqlite')
+    if backend == 'file':
+        store = FileSessionStore(os.environ.get('SESSION_DIR', 'sessions'))
+    else:
+        store = SQLiteSessionStore(os.environ.get('SESSION_DB_FILE', 'sessions.db'))
+    store = CachedSessionStore(store)
+    start_sweeper(store)
+    return ServerSideSessionInterface(store)
@@ -0,0 +1,15 @@
+import os
+import sqlite3
+
+# one sqlite connection per thread, kept open for the life of the worker;
+# `local` is the caller's threading.local()
+def local_connection(local, db_file):
+    conn = getattr(local, 'conn', None)
+    # connections must not be shared across a fork
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
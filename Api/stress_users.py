@@ -0,0 +1,75 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from repository import LogUserRepository, SQLiteUserRepository
+
+# hammers a repository from many threads and checks that nothing was lost,
+# run with: python stress_users.py [log|sqlite] [threads] [ops per thread]
+
+def worker(repo, seed, ops, names, errors):
+    rnd = random.Random(seed)
+    try:
+        for i in range(ops):
+            name = rnd.choice(names)
+            action = rnd.random()
+            if action < 0.3:
+                repo.create(name, {"age": rnd.randint(1, 99)})
+            elif action < 0.5:
+                repo.update(name, {"age": rnd.randint(1, 99)})
+            elif action < 0.6:
+                repo.delete(name)
+            elif action < 0.65:
+                repo.upsert_many([(rnd.choice(names), {"age": rnd.randint(1, 99)}) for j in range(20)])
+            else:
+                # paging must never see a name twice or out of order
+                page = repo.page(None, 50)
+                page_names = [row[0] for row in page]
+                if page_names != sorted(set(page_names)):
+                    errors.append(f"Inconsistent page: {page_names}")
+    except Exception as e:
+        errors.append(repr(e))
+
+def main(backend='log', threads=32, ops=2000):
+    directory = tempfile.mkdtemp()
+    try:
+        if backend == 'sqlite':
+            make = lambda: SQLiteUserRepository(os.path.join(directory, 'users.db'))
+        else:
+            make = lambda: LogUserRepository(os.path.join(directory, 'users.json'))
+        repo = make()
+        names = [f"user{i}" for i in range(500)]
+        errors = []
+        pool = [threading.Thread(target=worker, args=(repo, seed, ops, names, errors))
+                for seed in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        expected = dict(repo.items())
+        repo.close()
+
+        # whatever was acknowledged must come back after a restart
+        reopened = make()
+        actual = dict(reopened.items())
+        reopened.close()
+        if actual != expected:
+            errors.append("Reloaded store does not match the in-memory one")
+
+        total = threads * ops
+        print(f"{backend}: {total} operations from {threads} threads in {elapsed:.2f}s "
+              f"({total / elapsed:.0f} ops/s), {len(expected)} users")
+        for error in errors[:10]:
+            print("ERROR:", error)
+        return 1 if errors else 0
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(*args[:1], *[int(arg) for arg in args[1:3]]))
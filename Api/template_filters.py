@@ -0,0 +1,10 @@
+import html
+
+# autoescaping goes through markupsafe.escape, which builds a Markup object
+# for every value; in long listings that costs several times the rest of
+# the render. Templates turn autoescape off around such loops and run each
+# value through this once instead.
+def escape_text(value):
+    return html.escape(str(value))
+
+FILTERS = {"escape_text": escape_text}
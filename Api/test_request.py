@@ -1,16 +1,90 @@
+import json, os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
-for i in range(5):
-    try:
-        response = requests.get("https://official-joke-api.appspot.com/random_joke")
-        if response.status_code != 200:
-            print("Failed to retrieve a joke")
-            continue
-        joke = response.json()
+JOKE_URL = "https://official-joke-api.appspot.com/random_joke"
+CACHE_FILE = "jokes_cache.json"
+CACHE_TTL = 3600
+TIMEOUT = (3.05, 10)
+
+def fetch_joke(session, url=JOKE_URL, retries=3, backoff=0.5, timeout=TIMEOUT):
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code == 200:
+                return response.json()
+            error = requests.exceptions.HTTPError(f"Status {response.status_code}", response=response)
+            # only throttling and server errors are worth another try
+            if response.status_code != 429 and response.status_code < 500:
+                raise error
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    raise error
+
+# jokes already seen, keyed by url, kept on disk for `ttl` seconds
+class JokeCache:
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def get(self, url):
+        entry = self.read().get(url)
+        if entry is None or time.time() - entry["fetched"] > self.ttl:
+            return []
+        return entry["jokes"]
+
+    def put(self, url, jokes):
+        data = self.read()
+        data[url] = {"fetched": time.time(), "jokes": jokes}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp, self.path)
+
+# returns (jokes, errors); fetches concurrently over one session, drops
+# duplicate ids and keeps asking until n distinct jokes or max_rounds
+def fetch_jokes(n=5, url=JOKE_URL, workers=5, cache=None, max_rounds=3, **fetch_options):
+    if cache is not None:
+        cached = cache.get(url)
+        if len(cached) >= n:
+            return cached[:n], []
+    jokes = {}
+    errors = []
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        for attempt in range(max_rounds):
+            missing = n - len(jokes)
+            if missing <= 0:
+                break
+            futures = [pool.submit(fetch_joke, session, url, **fetch_options) for i in range(missing)]
+            for future in futures:
+                try:
+                    joke = future.result()
+                except requests.exceptions.RequestException as e:
+                    errors.append(e)
+                    continue
+                jokes.setdefault(joke.get("id", joke.get("setup")), joke)
+    jokes = list(jokes.values())[:n]
+    if cache is not None and jokes:
+        cache.put(url, jokes)
+    return jokes, errors
+
+if __name__ == "__main__":
+    jokes, errors = fetch_jokes(5, cache=JokeCache())
+    for i, joke in enumerate(jokes):
         print(f"{i+1}. Here's a random joke for you:\n")
         print(joke["setup"])
         print("👉", joke["punchline"])
-    except requests.exceptions.RequestException as e:
-        print(f"{i+1}, failed to fetch a joke")
+        print('-' * 40)
+    for e in errors:
+        print("Failed to fetch a joke")
         print(f"Reason: {e}")
-    print('-' * 40)
@@ -0,0 +1,69 @@
+import threading
+import time
+
+# token buckets per key: each key may burst up to `burst` requests and then
+# gets `rate` more per second
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    # returns (allowed, seconds until the next token)
+    def acquire(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+        return allowed, 0 if allowed else (1 - tokens) / self.rate
+
+    def prune(self, now):
+        # a bucket that has refilled completely is the same as no bucket
+        full = [key for key, (tokens, updated) in self.buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self.buckets[key]
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# concurrent calls with the same key share one execution of fn
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    # returns (result, shared); shared is True for callers that waited on
+    # another thread's call instead of running fn themselves
+    def do(self, key, fn):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
@@ -0,0 +1,108 @@
+import base64
+import json
+
+# user rules and storage calls shared by the Flask app (dynamic_user.py) and
+# the FastAPI app (main.py); every operation takes a repository and returns
+# (payload, status) so each framework only has to render it
+
+PAGE_SIZE = 500
+MAX_LIMIT = 1000
+
+def validate_user(name, age):
+    if not isinstance(name, str) or not name.strip():
+        return {"error": "Name cannot be empty"}, 400
+    if not age:
+        return {"error": "Age must be taken input"}, 400
+    try:
+        age = int(age)
+        if age <= 0:
+            return {"error": "Age must be a positive integer"}, 400
+    except (TypeError, ValueError):
+        # json bodies can carry lists or objects here
+        return {"error": "Age must be a valid integer"}, 400
+
+    return None, age
+
+def validate_name(name):
+    if not isinstance(name, str) or not name.strip():
+        return {"error": "Name cannot be empty"}, 400
+    return None
+
+def create_user(repo, name, age):
+    error, age = validate_user(name, age)
+    if error:
+        return error, 400
+    if not repo.create(name, {"age": age}):
+        return {"error": f"User {name} already exists"}, 400
+    return {"message": "User created successfully", name: {"age": age}}, 201
+
+def update_user(repo, name, age):
+    if not repo.exists(name):
+        return {"error": f"User {name} not found"}, 404
+    error, age = validate_user(name, age)
+    if error:
+        return error, 400
+    if not repo.update(name, {"age": age}):
+        return {"error": f"User {name} not found"}, 404
+    return {"message": "User updated successfully", name: {"age": age}}, 200
+
+def delete_user(repo, name):
+    error = validate_name(name)
+    if error:
+        return error, 400
+    if not repo.delete(name):
+        return {"error": f"User {name} not found"}, 404
+    return {"message": "User deleted successfully"}, 200
+
+def get_user(repo, name):
+    error = validate_name(name)
+    if error:
+        return error, 400
+    info = repo.get(name)
+    if info is None:
+        return {"error": f"User {name} not found"}, 404
+    return info, 200
+
+def encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode()).decode()
+
+def decode_cursor(cursor):
+    return base64.urlsafe_b64decode(cursor.encode()).decode()
+
+# returns (error, limit, after) for the limit/cursor query parameters
+def parse_page(limit, cursor):
+    try:
+        limit = min(int(limit or PAGE_SIZE), MAX_LIMIT)
+        if limit <= 0:
+            raise ValueError
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return {"error": "Invalid limit or cursor"}, None, None
+    return None, limit, after
+
+# returns (rows, next_cursor), next_cursor is None on the last page
+def list_page(repo, after, limit):
+    rows = repo.page(after, limit)
+    next_cursor = encode_cursor(rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
+
+# walks the store one page at a time so memory stays flat however many users exist
+def iter_users(repo, after=None):
+    while True:
+        rows = repo.page(after, PAGE_SIZE)
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        after = rows[-1][0]
+
+def stream_json(rows):
+    yield "{"
+    sep = ""
+    for name, info in rows:
+        yield f"{sep}{json.dumps(name)}:{json.dumps(info)}"
+        sep = ","
+    yield "}"
+
+def stream_ndjson(rows):
+    for name, info in rows:
+        yield json.dumps({"name": name, **info}) + "\n"
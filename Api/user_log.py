@@ -0,0 +1,190 @@
+import json, os
+import threading
+try:
+    import fcntl
+except ImportError:
+    # windows has no flock, the store is then unguarded against a second process
+    fcntl = None
+from metrics import PERSIST_SECONDS
+
+# append-only log of user mutations with a snapshot that gets compacted
+# in the background; one compact JSON line per mutation:
+#   {"op": "set", "name": ..., "value": {...}}
+#   {"op": "del", "name": ...}
+# and mutations submitted together share one line, so a torn write drops
+# the whole batch rather than part of it:
+#   {"op": "batch", "records": [{"op": "set", ...}, ...]}
+
+COMPACT_EVERY = 10000
+
+class UserLog:
+    def __init__(self, snapshot_file, log_file=None, compact_every=COMPACT_EVERY):
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file or os.path.splitext(snapshot_file)[0] + '.log'
+        self.old_log_file = self.log_file + '.old'
+        self.compact_every = compact_every
+        self.cond = threading.Condition()
+        self.pending = []
+        self.pending_records = 0
+        self.queued = self.written = 0
+        self.stopping = False
+        self.failed = None
+        self.records = 0
+        self.compacting = None
+        self.writer = None
+        self.data = None
+        self.f = None
+        self.lock_f = None
+
+    # only one process may own the log: another one would compact its own
+    # stale copy over the first one's writes when it closes. The lock is on
+    # a side file because the log itself gets rotated.
+    def lock(self):
+        self.lock_f = open(self.log_file + '.lock', 'a')
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self.lock_f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_f.close()
+            self.lock_f = None
+            raise RuntimeError(f"{self.log_file} is already open in another process")
+
+    def load(self):
+        self.lock()
+        data = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    data = {}
+        # a leftover .old log means we crashed mid compaction, its records
+        # are idempotent so replaying them on top of any snapshot is safe
+        interrupted = os.path.exists(self.old_log_file)
+        self.replay(self.old_log_file, data)
+        self.records, good = self.replay(self.log_file, data)
+        if interrupted:
+            self.compact(dict(data))
+        self.f = open(self.log_file, 'a')
+        self.f.truncate(good)
+        self.data = data
+        self.writer = threading.Thread(target=self.write_forever, daemon=True)
+        self.writer.start()
+        return data
+
+    def replay(self, path, data):
+        count = good = 0
+        if not os.path.exists(path):
+            return count, good
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn write at the tail of the log, everything before it is intact
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                for op in record["records"] if record["op"] == "batch" else [record]:
+                    if op["op"] == "set":
+                        data[op["name"]] = op["value"]
+                    elif op["op"] == "del":
+                        data.pop(op["name"], None)
+                    count += 1
+                good += len(line)
+        return count, good
+
+    # queues the current value of every name and returns a ticket; the
+    # caller waits on it outside any lock so concurrent writers share a flush
+    def submit(self, names):
+        records = []
+        for name in names:
+            if name in self.data:
+                records.append({"op": "set", "name": name, "value": self.data[name]})
+            else:
+                records.append({"op": "del", "name": name})
+        record = records[0] if len(records) == 1 else {"op": "batch", "records": records}
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.cond:
+            self.pending.append(line)
+            self.pending_records += len(records)
+            self.queued += 1
+            self.cond.notify_all()
+            return self.queued
+
+    def wait(self, ticket):
+        with self.cond:
+            while self.written < ticket:
+                if self.failed is not None:
+                    raise self.failed
+                self.cond.wait()
+
+    def append_many(self, names):
+        self.wait(self.submit(names))
+
+    # the single writer: drains everything queued since its last pass and
+    # persists it with one write and one fsync
+    def write_forever(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, []
+                written, self.pending_records = self.pending_records, 0
+                ticket = self.queued
+            try:
+                with PERSIST_SECONDS.time("log"):
+                    self.f.write(''.join(batch))
+                    self.f.flush()
+                    os.fsync(self.f.fileno())
+                self.records += written
+                if self.records >= self.compact_every and self.compacting is None:
+                    self.start_compaction()
+            except OSError as e:
+                # nothing queued after this point can be made durable
+                with self.cond:
+                    self.failed = e
+                    self.cond.notify_all()
+                return
+            with self.cond:
+                self.written = ticket
+                self.cond.notify_all()
+
+    def start_compaction(self):
+        # runs on the writer thread: rotate the log and copy the data so new
+        # records go to a fresh log while the snapshot is written; the copy
+        # already holds every record of the rotated log
+        self.f.close()
+        os.replace(self.log_file, self.old_log_file)
+        self.f = open(self.log_file, 'a')
+        self.records = 0
+        snapshot = dict(self.data)
+        self.compacting = threading.Thread(target=self.compact, args=(snapshot,), daemon=True)
+        self.compacting.start()
+
+    def compact(self, snapshot):
+        tmp = self.snapshot_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_file)
+        os.remove(self.old_log_file)
+        self.compacting = None
+
+    def close(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.writer.join()
+        if self.compacting is not None:
+            self.compacting.join()
+        # a process that never wrote leaves the log for the next one to replay
+        if self.records and self.written:
+            self.start_compaction()
+            self.compacting.join()
+        self.f.close()
+        self.lock_f.close()
@@ -0,0 +1,82 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+import team_form
+
+# times team_form over a full multi-league history against the row-by-row
+# loops it replaces, and checks both give the same tables and form.
+# Run with: python bench_team_form.py [seasons]   (synthetic history)
+#       or: python bench_team_form.py store       (the football_store dataset)
+
+def synthetic_history(leagues=5, seasons=6, teams=20, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for league in range(leagues):
+        names = [f"L{league} Team {team}" for team in range(teams)]
+        home, away = np.meshgrid(np.arange(teams), np.arange(teams), indexing='ij')
+        fixtures = home != away
+        home, away = home[fixtures], away[fixtures]
+        for season in range(seasons):
+            dates = pd.Timestamp(f"{2000 + season}-08-01") + pd.to_timedelta(rng.permutation(len(home)), unit='h')
+            frames.append(pd.DataFrame({
+                'league': f"L{league}", 'Season': season, 'Date': dates,
+                'HomeTeam': np.array(names)[home], 'AwayTeam': np.array(names)[away],
+                'home_goals': rng.poisson(1.5, len(home)), 'away_goals': rng.poisson(1.1, len(home)),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+def loop_table(df):
+    table = {}
+    for row in df.itertuples(index=False):
+        for team, scored, conceded in ((row.HomeTeam, row.home_goals, row.away_goals),
+                                       (row.AwayTeam, row.away_goals, row.home_goals)):
+            entry = table.setdefault((row.league, row.Season, team), [0, 0])
+            entry[0] += 3 if scored > conceded else 1 if scored == conceded else 0
+            entry[1] += scored - conceded
+    return table
+
+def loop_form(df, n=5):
+    recent = {}
+    form = {}
+    for row in df.sort_values('Date').itertuples(index=False):
+        for team, scored, conceded in ((row.HomeTeam, row.home_goals, row.away_goals),
+                                       (row.AwayTeam, row.away_goals, row.home_goals)):
+            points = recent.setdefault(team, [])
+            points.append(3 if scored > conceded else 1 if scored == conceded else 0)
+            form[(team, row.Date)] = sum(points[-n:])
+    return form
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main_bench(df):
+    print(f"{len(df)} matches, {df['HomeTeam'].nunique()} teams")
+    matches, t_matches = timed(team_form.team_matches, df)
+    table, t_table = timed(team_form.league_table, matches)
+    form, t_form = timed(team_form.rolling_form, matches)
+    splits, t_splits = timed(team_form.home_away_splits, matches)
+    h2h, t_h2h = timed(team_form.head_to_head, matches)
+    total = t_matches + t_table + t_form + t_splits + t_h2h
+    for label, seconds in (("team_matches", t_matches), ("league_table", t_table), ("rolling_form", t_form),
+                           ("home_away_splits", t_splits), ("head_to_head", t_h2h), ("total", total)):
+        print(f"{label:>16}: {seconds * 1000:8.1f} ms")
+
+    expected_table, t_loop_table = timed(loop_table, df)
+    expected_form, t_loop_form = timed(loop_form, df)
+    print(f"{'row loops':>16}: {(t_loop_table + t_loop_form) * 1000:8.1f} ms (table + form only)")
+
+    got_table = {(row.league, row.Season, row.team): [row.points, row.goal_difference] for row in table.itertuples()}
+    got_form = dict(zip(zip(form['team'].astype(str), form['Date']), form['form_points']))
+    assert got_table == expected_table, "league tables differ"
+    assert got_form == expected_form, "rolling form differs"
+    print("results match")
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['store']:
+        import season_store
+        main_bench(season_store.load(columns=team_form.MATCH_COLUMNS).dropna(subset=['home_goals', 'away_goals']))
+    else:
+        main_bench(synthetic_history(seasons=int(sys.argv[1]) if len(sys.argv) > 1 else 6))
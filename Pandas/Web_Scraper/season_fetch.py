@@ -0,0 +1,130 @@
+import hashlib
+import json, os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# downloads every league/season csv the notebook uses, concurrently over one
+# pooled session, and keeps them in a content-addressed cache: the bytes
+# live in objects/<sha256>.csv and index.json maps each url to its hash and
+# validators, so unchanged seasons come back as 304s and the cache still
+# works offline
+
+ROOT = "https://www.football-data.co.uk/mmz4281/"
+CACHE_DIR = "football_cache"
+dict_countries = {'La Liga': 'SP1', 'Spanish Segunda Div': 'SP2',
+                  'Bundesliga': 'D1',
+                  'EPL': 'E0', 'Eng League 1': 'E1'}
+SEASONS = range(20, 26)
+
+def season_url(root, season, code):
+    return root + str(season) + str(season + 1) + '/' + code + '.csv'
+
+class CsvCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.objects = os.path.join(directory, 'objects')
+        self.index_file = os.path.join(directory, 'index.json')
+        os.makedirs(self.objects, exist_ok=True)
+        self.lock = threading.Lock()
+        try:
+            with open(self.index_file, 'r') as f:
+                self.index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.index = {}
+
+    def entry(self, url):
+        with self.lock:
+            return self.index.get(url)
+
+    def read(self, url):
+        entry = self.entry(url)
+        if entry is None:
+            return None
+        with open(os.path.join(self.objects, entry["sha256"] + '.csv'), 'rb') as f:
+            return f.read()
+
+    def store(self, url, content, etag=None, last_modified=None):
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.objects, digest + '.csv')
+        # identical content is only ever written once
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+        with self.lock:
+            self.index[url] = {"sha256": digest, "etag": etag, "last_modified": last_modified}
+
+    def save(self):
+        with self.lock:
+            with open(self.index_file + '.tmp', 'w') as f:
+                json.dump(self.index, f, indent=4)
+            os.replace(self.index_file + '.tmp', self.index_file)
+
+def make_session(workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch(session, cache, url, timeout=30):
+    # a root that is a local directory (e.g. fixtures) is read straight from disk
+    if not url.startswith(("http://", "https://")):
+        with open(url, 'rb') as f:
+            return f.read()
+    entry = cache.entry(url)
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        if entry is None:
+            raise
+        print(f"Offline, using cached copy of {url}")
+        return cache.read(url)
+    if response.status_code == 304:
+        return cache.read(url)
+    response.raise_for_status()
+    cache.store(url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return response.content
+
+# returns {(league, season): csv bytes} for every league and season
+def fetch_all(leagues=None, seasons=SEASONS, root=ROOT, cache_dir=CACHE_DIR, workers=8):
+    leagues = leagues or dict_countries
+    cache = CsvCache(cache_dir)
+    jobs = [(league, season, season_url(root, season, leagues[league]))
+            for league in leagues for season in seasons]
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        contents = pool.map(lambda job: fetch(session, cache, job[2]), jobs)
+        results = {(league, season): content for (league, season, url), content in zip(jobs, contents)}
+    cache.save()
+    return results
+
+def read_season(content, season):
+    df = pd.read_csv(BytesIO(content), encoding='unicode_escape')
+    df.insert(1, 'Season', season)
+    return df
+
+# the notebook's dict_historical_data: one frame per league, all seasons stacked
+def load_historical_data(leagues=None, seasons=SEASONS, **options):
+    contents = fetch_all(leagues, seasons, **options)
+    frames = {}
+    for (league, season), content in contents.items():
+        frames.setdefault(league, []).append(read_season(content, season))
+    return {league: pd.concat(league_frames) for league, league_frames in frames.items()}
+
+if __name__ == "__main__":
+    import time
+    start = time.perf_counter()
+    dict_historical_data = load_historical_data()
+    print(f"Loaded {len(dict_historical_data)} leagues in {time.perf_counter() - start:.1f}s")
+    for league, df in dict_historical_data.items():
+        print(f"{league}: {len(df)} matches")
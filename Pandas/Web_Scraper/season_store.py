@@ -0,0 +1,252 @@
+import json, os
+import re
+from io import BytesIO
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from season_fetch import ROOT, dict_countries, SEASONS, fetch_all
+
+# normalized, compactly typed match data written as one parquet file per
+# league and season: <root>/league=E0/season=25/part-NNNNN.parquet. Seasons don't
+# share the same odds columns, so readers ask each file only for the
+# columns it has and pandas fills the rest with NaN. refresh() only
+# downloads the current season and adds the new matches as another part file.
+
+STORE_DIR = "football_store"
+STATE_FILE = "state.json"
+CURRENT_SEASON = max(SEASONS)
+
+# FTHG & FTAG are final time home goals and away goals
+RENAMES = {'FTHG': 'home_goals', 'FTAG': 'away_goals'}
+CATEGORIES = ['Div', 'HomeTeam', 'AwayTeam', 'FTR', 'HTR', 'Referee']
+COUNTS = ['home_goals', 'away_goals', 'HTHG', 'HTAG', 'HS', 'AS', 'HST', 'AST',
+          'HF', 'AF', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR']
+
+def normalize_name(name):
+    # csvs read with unicode_escape keep their utf-8 BOM as 'ï»¿'
+    name = name.replace('\ufeff', '').replace('\u00ef\u00bb\u00bf', '').strip()
+    name = RENAMES.get(name, name)
+    name = name.replace('>', '_over_').replace('<', '_under_')
+    return re.sub(r'[^0-9A-Za-z_]', '_', name)
+
+def parse_dates(dates):
+    # older seasons write two digit years
+    parsed = pd.to_datetime(dates, format='%d/%m/%Y', errors='coerce')
+    return parsed.fillna(pd.to_datetime(dates, format='%d/%m/%y', errors='coerce'))
+
+def normalize(df):
+    df = df.rename(columns=normalize_name)
+    df = df.loc[:, ~df.columns.duplicated()]
+    df = df.dropna(how='all')
+    if 'Date' in df:
+        df['Date'] = parse_dates(df['Date'])
+    if 'Time' in df:
+        times = pd.to_datetime(df['Time'], format='%H:%M', errors='coerce')
+        df['Time'] = times.dt.time.where(times.notna(), None)
+    for column in df.columns:
+        if column in CATEGORIES:
+            df[column] = df[column].astype('category')
+        elif column in COUNTS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int16')
+        elif column not in ('Date', 'Time'):
+            # everything else is betting odds or handicap lines
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float32')
+    return df.reset_index(drop=True)
+
+def partition_dir(root, code, season):
+    return os.path.join(root, f"league={code}", f"season={season}")
+
+# a refresh adds a part per run; past this many they are merged into one
+MAX_PARTS = 8
+
+def part_number(name):
+    return int(name[len('part-'):len('part-00000')])
+
+# the live parts of a partition: a merged part is named part-NNNNN-full and
+# replaces every part before it, so leftovers from an interrupted merge
+# are never read twice
+def part_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+    full = [i for i, name in enumerate(names) if name.endswith('-full.parquet')]
+    return [os.path.join(directory, name) for name in names[full[-1] if full else 0:]]
+
+def write_file(df, directory, suffix=''):
+    os.makedirs(directory, exist_ok=True)
+    numbers = [part_number(name) for name in os.listdir(directory) if name.endswith('.parquet')]
+    path = os.path.join(directory, f"part-{max(numbers, default=-1) + 1:05d}{suffix}.parquet")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+    return path
+
+def write_part(df, directory):
+    return write_file(df, directory)
+
+# replaces the whole partition with df as a single part
+def write_season(df, root, code, season):
+    directory = partition_dir(root, code, season)
+    path = write_file(df, directory, '-full')
+    # the new part already hides the old ones, removing them is cleanup
+    for name in os.listdir(directory):
+        if name.endswith('.parquet') and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+    return path
+
+def merge_parts(root, code, season):
+    paths = part_files(partition_dir(root, code, season))
+    df = pd.concat([pq.read_table(path).to_pandas() for path in paths], ignore_index=True)
+    # parts can disagree on categories, which concat turns into objects
+    for column in CATEGORIES:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return write_season(df, root, code, season)
+
+# state.json remembers the last match stored for each league/season so a
+# refresh knows where the new rows start
+def read_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def write_state(root, state):
+    path = os.path.join(root, STATE_FILE)
+    os.makedirs(root, exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+def match_key(row):
+    return [str(row['Date'].date()) if pd.notna(row['Date']) else None, row['HomeTeam'], row['AwayTeam']]
+
+# df is the whole season: remembers its last scored match and how many
+# unscored ones came before it
+def mark(state, code, season, df):
+    mask = scored(df)
+    if mask.any():
+        last = mask[mask].index[-1]
+        state[f"{code}/{season}"] = {"last": match_key(df.loc[last]), "pending": int((~mask.loc[:last]).sum())}
+
+# rows without a score yet (postponed or not yet played) are left for a
+# later refresh to pick up
+def scored(df):
+    scores = [column for column in ('home_goals', 'away_goals') if column in df]
+    return df[scores].notna().all(axis=1) if scores else pd.Series(True, index=df.index)
+
+def played(df):
+    return df[scored(df)].reset_index(drop=True)
+
+def read_csv(content):
+    return normalize(pd.read_csv(BytesIO(content), encoding='unicode_escape'))
+
+def ingest(leagues=None, seasons=SEASONS, root=STORE_DIR, source=ROOT, **fetch_options):
+    leagues = leagues or dict_countries
+    contents = fetch_all(leagues, seasons, source, **fetch_options)
+    state = read_state(root)
+    for (league, season), content in contents.items():
+        df = read_csv(content)
+        write_season(played(df), root, leagues[league], season)
+        mark(state, leagues[league], season, df)
+    write_state(root, state)
+
+# the scored rows of df that are not stored yet; df is the whole season
+# as downloaded, unscored rows included
+def new_rows(df, root, code, season, entry):
+    mask = scored(df)
+    if isinstance(entry, list):
+        # state written before pending matches were tracked
+        entry = {"last": entry, "pending": 0}
+    if entry is None:
+        # a season that was never stored is new in full
+        if not part_files(partition_dir(root, code, season)):
+            return df[mask]
+    else:
+        date, home, away = entry["last"]
+        last = df.index[(df['Date'].dt.strftime('%Y-%m-%d') == date)
+                        & (df['HomeTeam'] == home) & (df['AwayTeam'] == away) & mask]
+        # everything after the marker is new, unless a match listed before it
+        # was unscored last time or is now (postponed) and may have been
+        # played since
+        if len(last) and not entry["pending"] and mask.iloc[:last[-1]].all():
+            return df.loc[last[-1] + 1:][mask.loc[last[-1] + 1:]]
+    # otherwise compare against every stored match key
+    df = df[mask]
+    stored = load(root, ['Date', 'HomeTeam', 'AwayTeam'], [code], [season])
+    seen = pd.MultiIndex.from_frame(stored[['Date', 'HomeTeam', 'AwayTeam']].astype({'HomeTeam': str, 'AwayTeam': str}))
+    current = pd.MultiIndex.from_frame(df[['Date', 'HomeTeam', 'AwayTeam']].astype({'HomeTeam': str, 'AwayTeam': str}))
+    return df[~current.isin(seen)]
+
+# fetches only the current season and appends the matches played since the
+# last run as a new part file, merging the parts once there are more than
+# MAX_PARTS; returns {league code: rows appended}
+def refresh(leagues=None, season=CURRENT_SEASON, root=STORE_DIR, source=ROOT, **fetch_options):
+    leagues = leagues or dict_countries
+    contents = fetch_all(leagues, [season], source, **fetch_options)
+    state = read_state(root)
+    appended = {}
+    for (league, _), content in contents.items():
+        code = leagues[league]
+        df = read_csv(content)
+        entry = state.get(f"{code}/{season}")
+        rows = new_rows(df, root, code, season, entry)
+        if len(rows):
+            directory = partition_dir(root, code, season)
+            write_part(rows, directory)
+            if len(part_files(directory)) > MAX_PARTS:
+                merge_parts(root, code, season)
+        appended[code] = len(rows)
+        mark(state, code, season, df)
+    write_state(root, state)
+    return appended
+
+def partitions(root, leagues=None, seasons=None):
+    codes = None if leagues is None else {dict_countries.get(league, league) for league in leagues}
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for league_dir in sorted(os.listdir(root)):
+        if not league_dir.startswith('league='):
+            continue
+        code = league_dir.split('=', 1)[1]
+        if codes is not None and code not in codes:
+            continue
+        for season_dir in sorted(os.listdir(os.path.join(root, league_dir))):
+            season = int(season_dir.split('=', 1)[1])
+            if seasons is not None and season not in seasons:
+                continue
+            for path in part_files(os.path.join(root, league_dir, season_dir)):
+                found.append((code, season, path))
+    return found
+
+# reads only the requested columns of the requested partitions; leagues may be
+# given by name ('EPL') or code ('E0')
+def load(root=STORE_DIR, columns=None, leagues=None, seasons=None):
+    frames = []
+    for code, season, path in partitions(root, leagues, seasons):
+        available = pq.ParquetFile(path).schema_arrow.names
+        wanted = available if columns is None else [column for column in columns if column in available]
+        df = pq.read_table(path, columns=wanted).to_pandas()
+        df.insert(0, 'league', code)
+        df.insert(1, 'Season', season)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=['league', 'Season'] + list(columns or []))
+    df = pd.concat(frames, ignore_index=True)
+    for column in ['league'] + [column for column in CATEGORIES if column in df]:
+        df[column] = df[column].astype('category')
+    return df
+
+if __name__ == "__main__":
+    import sys
+    # `python season_store.py refresh` for the nightly update, no argument
+    # rebuilds every season
+    if sys.argv[1:] == ['refresh']:
+        for code, count in refresh().items():
+            print(f"{code}: {count} new matches")
+    else:
+        ingest()
+    df = load(columns=['Date', 'HomeTeam', 'AwayTeam', 'home_goals', 'away_goals'])
+    print(df.info(memory_usage='deep'))
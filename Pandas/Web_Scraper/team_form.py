@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# league tables, rolling form, home/away splits and head-to-head records for
+# every team at once. Takes the columns season_store.load() returns (league,
+# Season, Date, HomeTeam, AwayTeam, home_goals, away_goals) and never loops
+# over rows: each match becomes one row per team and the rest is groupby.
+
+MATCH_COLUMNS = ['league', 'Season', 'Date', 'HomeTeam', 'AwayTeam', 'home_goals', 'away_goals']
+
+# one row per team per match, from that team's point of view, sorted by
+# team and date
+def team_matches(df):
+    df = df.dropna(subset=['home_goals', 'away_goals'])
+    home_goals = df['home_goals'].to_numpy(dtype='int16')
+    away_goals = df['away_goals'].to_numpy(dtype='int16')
+    sides = []
+    for venue, team, opponent, scored, conceded in (('H', 'HomeTeam', 'AwayTeam', home_goals, away_goals),
+                                                    ('A', 'AwayTeam', 'HomeTeam', away_goals, home_goals)):
+        sides.append(pd.DataFrame({
+            'league': df['league'].to_numpy(),
+            'Season': df['Season'].to_numpy(),
+            'Date': df['Date'].to_numpy(),
+            'team': df[team].astype(str).to_numpy(),
+            'opponent': df[opponent].astype(str).to_numpy(),
+            'venue': venue,
+            'goals_for': scored,
+            'goals_against': conceded,
+        }))
+    matches = pd.concat(sides, ignore_index=True)
+    result = np.sign(matches['goals_for'].to_numpy() - matches['goals_against'].to_numpy())
+    matches['won'] = (result > 0).astype('int8')
+    matches['drawn'] = (result == 0).astype('int8')
+    matches['lost'] = (result < 0).astype('int8')
+    matches['points'] = np.select([result > 0, result == 0], [3, 1], 0).astype('int8')
+    for column in ('league', 'team', 'opponent', 'venue'):
+        matches[column] = matches[column].astype('category')
+    order = np.lexsort((matches['Date'].to_numpy(), matches['team'].cat.codes.to_numpy()))
+    return matches.iloc[order].reset_index(drop=True)
+
+def summarize(matches, keys):
+    table = matches.groupby(keys, observed=True).agg(
+        played=('points', 'size'), won=('won', 'sum'), drawn=('drawn', 'sum'), lost=('lost', 'sum'),
+        goals_for=('goals_for', 'sum'), goals_against=('goals_against', 'sum'), points=('points', 'sum'))
+    table['goal_difference'] = table['goals_for'] - table['goals_against']
+    return table.reset_index()
+
+# standings per league and season, ranked on points, goal difference and
+# goals scored; venue='H' or 'A' gives the home-only or away-only table
+def league_table(matches, venue=None):
+    if venue is not None:
+        matches = matches[matches['venue'] == venue]
+    table = summarize(matches, ['league', 'Season', 'team'])
+    table = table.sort_values(['league', 'Season', 'points', 'goal_difference', 'goals_for'],
+                              ascending=[True, True, False, False, False], ignore_index=True)
+    table.insert(2, 'position', table.groupby(['league', 'Season'], observed=True).cumcount() + 1)
+    return table
+
+# home and away records side by side, one row per team and season
+def home_away_splits(matches):
+    splits = summarize(matches, ['league', 'Season', 'team', 'venue'])
+    splits = splits.pivot(index=['league', 'Season', 'team'], columns='venue')
+    splits = splits.reindex(columns=['H', 'A'], level='venue')
+    splits.columns = [f"{'home' if venue == 'H' else 'away'}_{stat}" for stat, venue in splits.columns]
+    return splits.reset_index()
+
+# points, goals for and goals against over each team's last n matches,
+# including the match on that row; before=True gives the form going into
+# the match instead. Form carries over between seasons.
+def rolling_form(matches, n=5, before=False):
+    stats = matches[['points', 'goals_for', 'goals_against']].astype('int32')
+    # a rolling sum per team is the running total minus the running total n
+    # matches earlier
+    totals = stats.groupby(matches['team'], observed=True).cumsum()
+    skip = 1 if before else 0
+    by_team = totals.groupby(matches['team'], observed=True)
+    form = by_team.shift(skip, fill_value=0) - by_team.shift(n + skip, fill_value=0)
+    played = matches.groupby('team', observed=True).cumcount() + 1 - skip
+    form.columns = [f"form_{column}" for column in form.columns]
+    form['form_played'] = np.minimum(played, n)
+    return pd.concat([matches[['league', 'Season', 'Date', 'team', 'opponent', 'venue']], form], axis=1)
+
+# all-time record between every pair of teams that have met, from the point
+# of view of team_a (the alphabetically first of the pair); pass two teams
+# to get just their record, from the first one's point of view
+def head_to_head(matches, team_a=None, team_b=None):
+    team = matches['team'].astype(str)
+    opponent = matches['opponent'].astype(str)
+    if team_a is not None and team_b is not None:
+        pair = matches[(team == team_a) & (opponent == team_b)]
+        return summarize(pair.assign(team_a=team_a, team_b=team_b), ['team_a', 'team_b'])
+    pair = matches[team < opponent]
+    pair = pair.assign(team_a=pair['team'].astype(str), team_b=pair['opponent'].astype(str))
+    return summarize(pair, ['team_a', 'team_b'])
+
+if __name__ == "__main__":
+    import season_store
+    matches = team_matches(season_store.load(columns=MATCH_COLUMNS))
+    table = league_table(matches)
+    print(table[(table['league'] == 'E0') & (table['Season'] == table['Season'].max())].to_string(index=False))
+    form = rolling_form(matches)
+    print(form[form['team'] == 'Man City'].tail(5).to_string(index=False))
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import stat_matrix
+
+# query times for StatMatrix over a synthetic matrix of any size (2 million
+# rows by default), built the same way convert() builds the real one.
+# Run with: python bench_stat_matrix.py [rows]
+
+def build(path, count, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, len(stat_matrix.STATS)))
+    for start in range(0, count, stat_matrix.BLOCK):
+        block = rng.integers(5, 255, size=(min(stat_matrix.BLOCK, count - start), 6)).astype(np.float32)
+        matrix[start:start + len(block), :6] = block
+        matrix[start:start + len(block), 6] = block.sum(axis=1)
+    stat_matrix.write_index(path, matrix, (f"Pokemon {row}" for row in range(count)))
+    matrix.flush()
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f"{label:>24}: {(time.perf_counter() - start) * 1000:8.1f} ms   best: {result[0][0]} ({result[0][1]:g})")
+
+def main_bench(count=2000000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench_stats.npy")
+        build(path, count)
+        stats = stat_matrix.StatMatrix(path)
+        start = time.perf_counter()
+        stats.row("Pokemon 0")
+        print(f"{count} rows, names and row lookup loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+        timed("top Speed 10", stats.top, "Speed", 10)
+        timed("score Attack=2 Speed=1", stats.score, {"Attack": 2, "Speed": 1}, 10)
+        timed("similar Pokemon 1", stats.similar, "Pokemon 1", 5)
+        del stats
+
+if __name__ == "__main__":
+    main_bench(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,191 @@
+import csv
+import json, os
+import sys
+import numpy as np
+
+# the six battle stats (plus Total) of every Pokemon packed into one float32
+# .npy matrix that queries open with mmap_mode='r', next to a names file
+# giving the row order. Missing stats are NaN (data.json only has hp,
+# attack and total). Neither converting nor querying imports pandas.
+# Convert: python stat_matrix.py convert test.csv data.json
+# Query:   python stat_matrix.py top Speed 10
+#          python stat_matrix.py score Attack=2 Speed=1 10
+#          python stat_matrix.py similar Pikachu 5
+
+STATS = ["HP", "Attack", "Defense", "Sp. Atk", "Sp. Def", "Speed", "Total"]
+MATRIX_FILE = "pokemon_stats.npy"
+# data.json's keys for the stats it has
+JSON_KEYS = {"hp": "HP", "attack": "Attack", "defense": "Defense", "sp_atk": "Sp. Atk",
+             "sp_def": "Sp. Def", "speed": "Speed", "total": "Total"}
+# rows per block when scanning, so a query never holds more than one block's
+# temporaries however large the matrix
+BLOCK = 1 << 20
+
+def names_file(path):
+    return os.path.splitext(path)[0] + ".names"
+
+def meta_file(path):
+    return os.path.splitext(path)[0] + ".json"
+
+# yields (name, {stat: value}) from a csv with a Name column or a json list
+# of records with a name key
+def read_records(path):
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            for record in json.load(f):
+                yield record["name"], {JSON_KEYS[key]: value for key, value in record.items() if key in JSON_KEYS}
+    else:
+        with open(path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                yield row["Name"], {stat: row[stat] for stat in STATS if row.get(stat) not in (None, "")}
+
+def convert(sources, path=MATRIX_FILE):
+    # first pass fixes the row of every name; a name in several sources keeps
+    # one row and later sources only fill the stats earlier ones lacked
+    rows = {}
+    for source in sources:
+        for name, stats in read_records(source):
+            rows.setdefault(name, len(rows))
+    matrix = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float32, shape=(len(rows), len(STATS)))
+    matrix[:] = np.nan
+    columns = {stat: j for j, stat in enumerate(STATS)}
+    for source in sources:
+        for name, stats in read_records(source):
+            row = matrix[rows[name]]
+            for stat, value in stats.items():
+                if np.isnan(row[columns[stat]]):
+                    row[columns[stat]] = float(value)
+    # every file is written before any is swapped in, matrix first, so a
+    # crash never pairs a new index with an old matrix
+    write_index(path, matrix, rows, ".tmp")
+    matrix.flush()
+    del matrix
+    for target in (path, names_file(path), meta_file(path)):
+        os.replace(target + ".tmp", target)
+    return len(rows)
+
+# names in row order, plus the column means and spreads similar() scales by;
+# suffix is added to both file names
+def write_index(path, matrix, rows, suffix=""):
+    with open(names_file(path) + suffix, "w") as f:
+        f.writelines(name + "\n" for name in rows)
+    total = np.zeros(len(STATS))
+    squares = np.zeros(len(STATS))
+    count = np.zeros(len(STATS))
+    for start in range(0, len(matrix), BLOCK):
+        block = matrix[start:start + BLOCK].astype(np.float64)
+        present = ~np.isnan(block)
+        total += np.where(present, block, 0).sum(axis=0)
+        squares += np.where(present, block * block, 0).sum(axis=0)
+        count += present.sum(axis=0)
+    mean = total / np.maximum(count, 1)
+    std = np.sqrt(np.maximum(squares / np.maximum(count, 1) - mean * mean, 0))
+    meta = {"columns": STATS, "rows": len(matrix), "mean": mean.tolist(), "std": std.tolist()}
+    with open(meta_file(path) + suffix, "w") as f:
+        json.dump(meta, f, indent=4)
+
+class StatMatrix:
+    def __init__(self, path=MATRIX_FILE):
+        self.matrix = np.load(path, mmap_mode="r")
+        with open(meta_file(path), "r") as f:
+            meta = json.load(f)
+        self.columns = {stat: j for j, stat in enumerate(meta["columns"])}
+        self.std = np.array(meta["std"], dtype=np.float32)
+        self.path = path
+        self.names = None
+        self.rows = None
+
+    # the names, and the lookup from name to row, are only read the first
+    # time a query needs them
+    def load_names(self):
+        if self.names is None:
+            with open(names_file(self.path), "r") as f:
+                self.names = f.read().splitlines()
+
+    def row(self, name):
+        if self.rows is None:
+            self.load_names()
+            self.rows = {name: row for row, name in enumerate(self.names)}
+        if name not in self.rows:
+            raise KeyError(f"Unknown Pokemon {name}")
+        return self.rows[name]
+
+    def column(self, stat):
+        if stat not in self.columns:
+            raise KeyError(f"Unknown stat {stat}, expected one of {', '.join(self.columns)}")
+        return self.columns[stat]
+
+    # runs score(block, start) over the matrix a block at a time and keeps
+    # the k rows with the highest scores; NaN scores never make the cut
+    def best(self, score, k):
+        if k <= 0:
+            return []
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.matrix), BLOCK):
+            scores = np.nan_to_num(score(self.matrix[start:start + BLOCK], start), nan=-np.inf)
+            candidates = np.concatenate([best_scores, scores])
+            rows = np.concatenate([best_rows, np.arange(start, start + len(scores))])
+            if len(candidates) > k:
+                keep = np.argpartition(-candidates, k - 1)[:k]
+                candidates, rows = candidates[keep], rows[keep]
+            best_scores, best_rows = candidates, rows
+        found = np.isfinite(best_scores)
+        best_scores, best_rows = best_scores[found], best_rows[found]
+        order = np.lexsort((best_rows, -best_scores))
+        self.load_names()
+        return [(self.names[row], float(best_scores[i])) for i, row in zip(order, best_rows[order])]
+
+    # [(name, value)] for the k highest values of one stat
+    def top(self, stat, k=10):
+        j = self.column(stat)
+        return self.best(lambda block, start: block[:, j], k)
+
+    # [(name, score)] for the k highest weighted sums, e.g. {"Attack": 2, "Speed": 1}
+    def score(self, weights, k=10):
+        columns = [self.column(stat) for stat in weights]
+        w = np.array(list(weights.values()), dtype=np.float32)
+        return self.best(lambda block, start: block[:, columns] @ w, k)
+
+    # [(name, distance)] for the k Pokemon nearest to name, comparing the
+    # given stats after scaling each to unit spread; rows missing any of
+    # those stats are skipped
+    def similar(self, name, k=5, stats=STATS[:6]):
+        me = self.row(name)
+        columns = [self.column(stat) for stat in stats]
+        scale = np.where(self.std[columns] > 0, self.std[columns], 1)
+        target = self.matrix[me, columns] / scale
+        if np.isnan(target).any():
+            raise ValueError(f"{name} is missing some of {', '.join(stats)}")
+
+        def closeness(block, start):
+            distance = np.sqrt((((block[:, columns] / scale) - target) ** 2).sum(axis=1))
+            if start <= me < start + len(block):
+                distance[me - start] = np.nan
+            return -distance
+        return [(other, -value) for other, value in self.best(closeness, k)]
+
+def parse_weights(args):
+    weights = {}
+    for arg in args:
+        stat, _, weight = arg.partition("=")
+        weights[stat] = float(weight or 1)
+    return weights
+
+if __name__ == "__main__":
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "convert":
+        print(f"Packed {convert(args or ['test.csv', 'data.json'])} Pokemon into {MATRIX_FILE}")
+    else:
+        stats = StatMatrix()
+        if command == "top":
+            results = stats.top(args[0], int(args[1]) if len(args) > 1 else 10)
+        elif command == "score":
+            k = int(args.pop()) if args[-1].isdigit() else 10
+            results = stats.score(parse_weights(args), k)
+        elif command == "similar":
+            results = stats.similar(args[0], int(args[1]) if len(args) > 1 else 5)
+        else:
+            sys.exit(f"Unknown command {command}, expected convert, top, score or similar")
+        for name, value in results:
+            print(f"{name}: {value:g}")
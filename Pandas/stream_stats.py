@@ -0,0 +1,90 @@
+import argparse
+import sys
+import pandas as pd
+
+# first.py's summary for csvs too big to load: reads only the needed columns
+# a chunk at a time, folds each chunk into running totals and prints the
+# result a line at a time, so memory depends on the chunk size and the
+# number of distinct types, not on the file size.
+# Run with: python stream_stats.py test.csv --top 10
+#           python stream_stats.py huge.csv --names > names.txt
+
+STATS = ["HP", "Attack", "Defense", "Sp. Atk", "Sp. Def", "Speed", "Total"]
+GROUPS = ["Type 1", "Generation"]
+CHUNK_SIZE = 100000
+
+class StreamStats:
+    def __init__(self, top=10):
+        self.top = top
+        self.rows = 0
+        self.counts = {group: pd.Series(dtype="int64") for group in GROUPS}
+        self.sums = pd.Series(0.0, index=STATS)
+        self.present = pd.Series(0, index=STATS)
+        self.best = None
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        for group in GROUPS:
+            self.counts[group] = self.counts[group].add(chunk[group].value_counts(), fill_value=0)
+        stats = chunk[STATS]
+        self.sums += stats.astype("float64").sum()
+        self.present += stats.count()
+        # the overall top n is always among each chunk's top n
+        best = chunk.nlargest(self.top, "Total")[["Name", "Total"]]
+        if self.best is not None:
+            best = pd.concat([self.best, best]).nlargest(self.top, "Total")
+        self.best = best
+
+    def lines(self):
+        yield f"rows: {self.rows}"
+        for group in GROUPS:
+            yield ""
+            yield f"count by {group}:"
+            for value, count in self.counts[group].sort_index().items():
+                yield f"  {value}: {int(count)}"
+        yield ""
+        yield "mean stats:"
+        for stat, mean in (self.sums / self.present).items():
+            yield f"  {stat}: {mean:.2f}"
+        yield ""
+        yield f"top {self.top} by Total:"
+        if self.best is not None:
+            for name, total in self.best.itertuples(index=False):
+                yield f"  {name}: {total:g}"
+
+def read_chunks(path, columns, chunksize=CHUNK_SIZE):
+    dtypes = {stat: "float32" for stat in STATS if stat in columns}
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+def summarize(path, top=10, chunksize=CHUNK_SIZE):
+    summary = StreamStats(top)
+    for chunk in read_chunks(path, ["Name"] + GROUPS + STATS, chunksize):
+        summary.add(chunk)
+    return summary
+
+# the streaming version of print(df["Name"].to_string())
+def write_names(path, out, chunksize=CHUNK_SIZE):
+    for chunk in read_chunks(path, ["Name"], chunksize):
+        out.writelines(name + "\n" for name in chunk["Name"].astype(str))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a large Pokemon stats csv in constant memory")
+    parser.add_argument("path", nargs="?", default="test.csv")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--names", action="store_true", help="only list the Name column")
+    parser.add_argument("--output", help="write to this file instead of stdout")
+    args = parser.parse_args(argv)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.names:
+            write_names(args.path, out, args.chunksize)
+        else:
+            for line in summarize(args.path, args.top, args.chunksize).lines():
+                out.write(line + "\n")
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()